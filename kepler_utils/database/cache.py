@@ -75,7 +75,7 @@ def max_sn (datadump):
     return np.max (datadump ['sn'])
 
 def tasbsg (cnv_record):
-    radii = u.Quantity ([model [-1] for model in cnv_record ['rncoord']])
+    radii = cnv_record.column ('rncoord').last () * cnv_record.unit ('rncoord')
     return np.sum (cnv_record ['dt'] [np.logical_and (radii > 2e12 * u.cm, radii < 8e12 * u.cm)]).to (u.year)
 
 def ledd_shell (datadump):
@@ -101,11 +101,11 @@ def L_ratio (datadump):
 def fasRSG (cnvdata):
     h1 = cnvdata ["abun_cnv"] [:,1]
     total = (cnvdata [-1] ["timesec"] - cnvdata [np.argmax (h1 < 0.001)] ["timesec"]) * u.s
-    radii = u.Quantity ([i [-1] for i in cnvdata ["rncoord"]])
+    radii = cnvdata.column ("rncoord").last () * cnvdata.unit ("rncoord")
     return np.sum (cnvdata ["dt"] [radii > 1.e13 * u.cm]) / total
 
 def fasBL (cnvdata):
-    radii = u.Quantity ([i [-1] for i in cnvdata ["rncoord"]])
+    radii = cnvdata.column ("rncoord").last () * cnvdata.unit ("rncoord")
     for i, r in enumerate (radii):
         if r > 1.e13 * u.cm:
             break
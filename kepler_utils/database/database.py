@@ -1,5 +1,7 @@
 import os
-import glob
+import fnmatch
+import json
+import concurrent.futures
 import datetime
 import inspect
 import abc
@@ -24,26 +26,163 @@ from kepler_utils.records.cnv import CNVFile
 # Setup the declarative base class for inheritance
 Base = declarative_base ()
 
-def Session (password = None, *args, **kwargs):
-    if password is None and Session.password_cache is None:
-        password = getpass.getpass ()
-    if password is None and Session.password_cache is not None:
-        password = Session.password_cache
+# The database used unless configure is given another or KEPLER_DATABASE_URL is set; the password is asked for when the engine is made
+default_url = 'postgresql://justinbrown:%s@loki.ucsc.edu:5432/keplerdb'
 
-    engine = sqlalchemy.create_engine ('postgresql://justinbrown:%s@loki.ucsc.edu:5432/keplerdb' % password, echo = False)
+# The configured database, and the engine and session factory made for it in the process with id pid
+_engine = {'url': None, 'options': {}, 'engine': None, 'factory': None, 'pid': None}
 
-    Base.metadata.create_all (engine)
+# The databases whose tables have already been created by this process (or its parent)
+_created = set ()
 
-    if Session.password_cache is None:
-        Session.password_cache = password
+def configure (url = None, pool_size = None, max_overflow = None, **kwargs):
+    """
+    Set the database that Session connects to, disposing of any engine made for a previous one
+    
+    The url defaults to the KEPLER_DATABASE_URL environment variable, and then to default_url, in which %s is replaced by the password; pool_size, the number of connections kept open, defaults to KEPLER_DATABASE_POOL_SIZE, and then to the sqlalchemy default. Any other keyword arguments are passed to sqlalchemy.create_engine. The engine is only made when first needed
+    """
+    if url is None:
+        url = os.environ.get ('KEPLER_DATABASE_URL', default_url)
+    if pool_size is None and os.environ.get ('KEPLER_DATABASE_POOL_SIZE'):
+        pool_size = int (os.environ ['KEPLER_DATABASE_POOL_SIZE'])
+    if pool_size is not None:
+        kwargs ['pool_size'] = pool_size
+    if max_overflow is not None:
+        kwargs ['max_overflow'] = max_overflow
+    kwargs.setdefault ('echo', False)
+    # Check connections before handing them out, since long-running processes can outlive them
+    kwargs.setdefault ('pool_pre_ping', True)
+    if _engine ['engine'] is not None and _engine ['pid'] == os.getpid ():
+        _engine ['engine'].dispose ()
+    _engine.update (url = url, options = kwargs, engine = None, factory = None, pid = None)
 
-    return sqlalchemy.orm.sessionmaker (bind = engine) (*args, **kwargs)
+def get_engine (password = None):
+    """
+    Return the engine of the configured database, making it if this process does not have one yet
+    
+    Each process makes one engine, whose pool of connections is shared by all its sessions; the tables are created the first time a database is connected to
+    """
+    if _engine ['url'] is None:
+        configure ()
+    if _engine ['engine'] is not None:
+        if _engine ['pid'] == os.getpid ():
+            return _engine ['engine']
+        # The engine was inherited from a parent process, so leave its connections to the parent
+        _engine ['engine'].dispose (close = False)
+    
+    url = _engine ['url']
+    if '%s' in url:
+        if password is None:
+            password = Session.password_cache
+        if password is None:
+            password = getpass.getpass ()
+        if Session.password_cache is None:
+            Session.password_cache = password
+        url = url % password
+    engine = sqlalchemy.create_engine (url, **_engine ['options'])
+    
+    if _engine ['url'] not in _created:
+        Base.metadata.create_all (engine)
+        _created.add (_engine ['url'])
+    
+    _engine.update (engine = engine, factory = sqlalchemy.orm.sessionmaker (bind = engine), pid = os.getpid ())
+    return engine
+
+def Session (password = None, *args, **kwargs):
+    """
+    Return a new session of the configured database, drawing its connections from the pool of this process
+    """
+    get_engine (password)
+    return _engine ['factory'] (*args, **kwargs)
 
 Session.password_cache = None
 
 # A conversion from string to sqlalchemy types
 types = {'float' : sqlalchemy.Float, 'integer' : sqlalchemy.Integer}
 
+def batches (items, batch_size):
+    """
+    Split the list items into lists of at most batch_size items
+    """
+    return [items [i:i + batch_size] for i in range (0, len (items), batch_size)]
+
+def _glob_match (parts, pattern):
+    """
+    Return whether the last of the path components parts match the components of the glob pattern; as in glob, a wildcard does not match a name starting with '.'
+    """
+    if len (parts) < len (pattern):
+        return False
+    for part, piece in zip (parts [len (parts) - len (pattern):], pattern):
+        if part.startswith ('.') and not piece.startswith ('.'):
+            return False
+        if not fnmatch.fnmatch (part, piece):
+            return False
+    return True
+
+def scan_directory (directory, glob_string = '*', index_file = None, exclude = ()):
+    """
+    Return the modification dates of the files in directory and its subdirectories that match glob_string, but none of the patterns in exclude, by absolute path
+    
+    The tree is walked once with os.scandir, matching glob_string in each directory as glob would and taking the dates from the directory entries
+    
+    If index_file is not None, the modification times of the directories and of the files matching in them are saved to that json file, and a directory that has not been modified since the last scan is not listed again. Writing into an existing file does not modify its directory, so the files that matched in such a directory are still checked one by one
+    """
+    directory = os.path.abspath (directory)
+    pattern = glob_string.split (os.sep)
+    saved = {}
+    if index_file is not None:
+        try:
+            with open (index_file, 'r') as file:
+                saved = json.load (file)
+        except (IOError, ValueError):
+            saved = {}
+    known = saved.get (directory, {}).get (glob_string, {})
+    
+    scanned = {}
+    files = {}
+    # Walk the tree depth first, in the order of os.walk
+    stack = [(directory, ())]
+    while len (stack) > 0:
+        path, parts = stack.pop ()
+        try:
+            mtime = os.stat (path).st_mtime_ns
+        except OSError:
+            continue
+        listing = known.get (path)
+        if listing is not None and listing ['mtime'] == mtime:
+            # The names in the directory are unchanged, but its files may have been rewritten in place
+            for name in list (listing ['files']):
+                try:
+                    listing ['files'] [name] = os.stat (os.path.join (path, name)).st_mtime
+                except OSError:
+                    del listing ['files'] [name]
+        else:
+            listing = {'mtime': mtime, 'files': {}, 'dirs': []}
+            try:
+                with os.scandir (path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir (follow_symlinks = False):
+                                listing ['dirs'].append (entry.name)
+                            elif entry.is_file () and _glob_match (parts + (entry.name,), pattern):
+                                listing ['files'] [entry.name] = entry.stat ().st_mtime
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        scanned [path] = listing
+        for name, file_mtime in listing ['files'].items ():
+            if not any (fnmatch.fnmatch (name, excluded) for excluded in exclude):
+                files [os.path.join (path, name)] = datetime.datetime.fromtimestamp (file_mtime)
+        stack.extend ((os.path.join (path, name), parts + (name,)) for name in reversed (listing ['dirs']))
+    
+    if index_file is not None:
+        saved.setdefault (directory, {}) [glob_string] = scanned
+        with open (index_file + '.tmp', 'w') as file:
+            json.dump (saved, file)
+        os.replace (index_file + '.tmp', index_file)
+    return files
+
 class setup_parameters (object):
     """
     This decorator is designed to take a parameter file with the following tab-separated format:
@@ -90,6 +229,45 @@ class setup_parameters (object):
             
         return cls
 
+def _column_values (instance):
+    """
+    Return the values of the columns set on instance, an object that has not been added to a session, as a mapping for a bulk insert
+    """
+    state = sqlalchemy.inspect (instance)
+    return {attribute.key: state.dict [attribute.key] for attribute in state.mapper.column_attrs if attribute.key in state.dict}
+
+def function_code (function):
+    """
+    Return the source code of function, which is saved with its cached values to tell whether they are out of date
+    """
+    try:
+        return ''.join (inspect.getsourcelines (function) [0])
+    except TypeError:
+        return 'unable to read'
+
+def _read_header (cls, file):
+    """
+    Return the header of file read by cls.read_header, or None if it cannot be read, so that one bad file does not stop a scan
+    This is a module function so that it can be run by the processes of a pool
+    """
+    try:
+        return cls.read_header (file)
+    except Exception as e:
+        print ("Warning: Unable to read %s, skipping: %s" % (file, e))
+        return None
+
+def _evaluate_cache (cls, file, funcs, kwargs):
+    """
+    Load the data of the file of a cls entry once, passing kwargs to get_data, and evaluate each of funcs, a dictionary of functions by cache name, on it
+    Return the file and the value and unit of each result by name; this is a module function so that it can be run by the processes of a pool
+    """
+    data = cls (file = file).get_data (cache = False, **kwargs)
+    results = {}
+    for name, function in funcs.items ():
+        result = u.Quantity (function (data))
+        results [name] = (result.value, str (result.unit))
+    return file, results
+
 class Cache (object):
     """
     A mixin object for a cache entry object to inherit, providing the relevant columns and accessors
@@ -133,10 +311,7 @@ class Cache (object):
         # Define the caching method for cls, which will check whether the value has been cached previously
         def cache (self, session, cache_name, function = None, **kwargs):
             # Create a string version of the function for code comparison
-            try:
-                code = ''.join (inspect.getsourcelines (function) [0])
-            except TypeError:
-                code = 'unable to read'
+            code = function_code (function)
                 
             # Check if the cached function already exists in the current cache
             for cache in self.cached:
@@ -276,6 +451,9 @@ class FileEntry (object):
     file = sqlalchemy.Column (sqlalchemy.String, primary_key=True)
     date = sqlalchemy.Column (sqlalchemy.DateTime)
     
+    # The patterns of the names of files that match the glob strings of scans but are not files of this kind
+    exclude = ()
+    
     @declared_attr
     def simulation_id(cls):
         return sqlalchemy.Column ('simulation_id', sqlalchemy.ForeignKey('simulations.id'))
@@ -296,9 +474,33 @@ class FileEntry (object):
     def addToSimulation (self, simulationEntry):
         pass
         
+    def updateSimulation (self, simulationEntry):
+        """
+        Update simulationEntry with what this entry tells about its simulation, without linking them; this is done as the entry is added to it
+        """
+        pass
+        
     @classmethod
-    @abc.abstractmethod
     def genFromFile (cls, file):
+        """
+        Read file and generate its entry; return the entry, the runid of its simulation, and the name of its simulation
+        """
+        return cls.genFromHeader (cls.read_header (file))
+        
+    @classmethod
+    @abc.abstractmethod
+    def read_header (cls, file):
+        """
+        Read what is needed for the entry of file into a plain dictionary, which can be sent between processes; it includes the 'runid' and 'name' of the simulation
+        """
+        pass
+        
+    @classmethod
+    @abc.abstractmethod
+    def genFromHeader (cls, header):
+        """
+        Generate the entry of a file from the dictionary returned by read_header; return the entry, the runid of its simulation, and the name of its simulation
+        """
         pass
         
     @classmethod
@@ -375,16 +577,158 @@ class FileEntry (object):
         session.add (entry)
         
     @classmethod
-    def scan_for_updates (cls, directory, glob_string = '*', tags = None, template_name = None, log_info = False):
+    def bulk_update_database (cls, session, directory, glob_string = '*', tags = None, template_name = None, goal_state = 'presn', log_info = False, batch_size = 1000, processes = None, index_file = None):
         """
-        Scan the directory for files matching glob_string and add them to the database
+        Bring the entries of the files in directory (and its subdirectories) matching glob_string up to date in one pass, committing every batch_size files
+        
+        All the known files of the directory and their dates are fetched in one query and compared to a single scan of the directory, so only the headers of new or changed files are read. Entries of deleted or changed files are deleted in bulk, simulations are looked up once per directory, and new entries are inserted a batch at a time
+        
+        If processes is more than one, the headers of each batch are read in parallel by a pool of that many processes with read_header; the entries are still generated and written by this process
+        
+        The directory is scanned by scan_directory, which skips the directories that have not changed since the last scan saved to index_file
         """
+        real_tags = []
+        if isinstance (tags, str):
+            tags = [tags]
+        if tags is not None:
+            for tag in tags:
+                real_tags.append (Tag.get (session, tag))
+        
+        template_hash = None
+        if template_name is not None:
+            template_hash = hashlib.md5 (open (template_name).read ().encode ()).hexdigest ()
+        
+        directory = os.path.abspath (directory)
+        files = scan_directory (directory, glob_string, index_file, cls.exclude)
+        known = dict (session.query (cls.file, cls.date).filter (cls.file.startswith (os.path.join (directory, ''), autoescape = True)).all ())
+        # Only the files matching glob_string were scanned, so leave the entries of any others alone
+        pattern = glob_string.split (os.sep)
+        known = {file: date for file, date in known.items () if _glob_match (tuple (os.path.relpath (file, directory).split (os.sep)), pattern)}
+        new = sorted (file for file in files if file not in known or known [file] < files [file])
+        unchanged = [file for file in files if file in known and known [file] >= files [file]]
+        stale = [file for file in known if file not in files or known [file] < files [file]]
+        if log_info:
+            print ("Found %i files in %s: %i new or changed, %i deleted" % (len (files), directory, len (new), len (stale) - len (new) + len ([file for file in new if file not in known])))
+        
+        # Remove the entries of deleted and changed files, detaching their cached values as deleting them one by one would
+        for batch in batches (stale, batch_size):
+            if hasattr (cls, 'Cache'):
+                session.query (cls.Cache).filter (cls.Cache.file.in_ (batch)).update ({cls.Cache.file: None}, synchronize_session = False)
+            session.query (cls).filter (cls.file.in_ (batch)).delete (synchronize_session = False)
+        
+        # Tag the simulations of the files that are already up to date
+        if real_tags:
+            for batch in batches (unchanged, batch_size):
+                for simulation in session.query (SimulationEntry).join (cls, cls.simulation_id == SimulationEntry.id).filter (cls.file.in_ (batch)):
+                    for tag in real_tags:
+                        if tag not in simulation.tags:
+                            simulation.tags.append (tag)
+        cls._commit (session)
+        
+        # Look up the simulations of every directory with new files at once
+        simulations = {}
+        for batch in batches (sorted (set (os.path.dirname (file) for file in new)), batch_size):
+            for simulation in session.query (SimulationEntry).filter (SimulationEntry.path.in_ (batch)):
+                simulations [(simulation.path, simulation.name)] = simulation
+        
+        executor = concurrent.futures.ProcessPoolExecutor (processes) if processes is not None and processes > 1 else None
+        try:
+            for batch in batches (new, batch_size):
+                if executor is not None:
+                    headers = list (executor.map (_read_header, [cls] * len (batch), batch, chunksize = max (1, len (batch) // (4 * processes))))
+                else:
+                    headers = [_read_header (cls, file) for file in batch]
+                cls._add_batch (session, headers, simulations, real_tags, template_name, template_hash, goal_state)
+                cls._commit (session)
+                if log_info:
+                    print ("Added a batch of %i files" % len (batch))
+        finally:
+            if executor is not None:
+                executor.shutdown ()
+    
+    @classmethod
+    def _add_batch (cls, session, headers, simulations, real_tags, template_name, template_hash, goal_state):
+        """
+        Generate the entries of a batch of files from their headers and add them to their simulations, creating the simulations that do not exist in simulations, a dictionary by path and name
+        
+        The new simulations and the entries are written with bulk inserts rather than as objects of the session; the new simulations are then loaded into simulations in one query
+        """
+        created = {}
+        members = {}
+        for header in headers:
+            if header is None:
+                continue
+            entry, runid, name = cls.genFromHeader (header)
+            key = (os.path.dirname (header ['file']), name)
+            simulation = created.get (key, simulations.get (key))
+            if simulation is not None and runid is not None and simulation.runid != runid:
+                print ("Warning: Simulation runid does not match run, resetting")
+                if key in created:
+                    del created [key]
+                else:
+                    session.delete (simulation)
+                    session.flush ()
+                    del simulations [key]
+                members.pop (key, None)
+                simulation = None
+            if simulation is None:
+                simulation = SimulationEntry (runid = runid, name = name, path = key [0], template_name = template_name, template_hash = template_hash)
+                created [key] = simulation
+            entry.updateSimulation (simulation)
+            members.setdefault (key, []).append (entry)
+        
+        if created:
+            session.bulk_insert_mappings (SimulationEntry, [_column_values (simulation) for simulation in created.values ()])
+            for simulation in session.query (SimulationEntry).filter (SimulationEntry.path.in_ (set (path for path, name in created))):
+                if (simulation.path, simulation.name) in created:
+                    simulations [(simulation.path, simulation.name)] = simulation
+            if real_tags:
+                session.execute (sim_tags.insert (), [{'sim_id': simulations [key].id, 'tag_id': tag.id} for key in created for tag in real_tags])
+        for key in members:
+            if key not in created:
+                for tag in real_tags:
+                    if tag not in simulations [key].tags:
+                        simulations [key].tags.append (tag)
+        session.bulk_insert_mappings (cls, [dict (_column_values (entry), simulation_id = simulations [key].id) for key, entries in members.items () for entry in entries])
+        
+        # The files are not added in run order, so check for the goal state including these files
+        ids = [simulations [key].id for key in members]
+        complete = session.query (DumpFileEntry.simulation_id).filter (DumpFileEntry.simulation_id.in_ (ids), DumpFileEntry.state == goal_state)
+        session.query (SimulationEntry).filter (SimulationEntry.id.in_ (complete)).update ({SimulationEntry.complete: True}, synchronize_session = False)
+    
+    @staticmethod
+    def _commit (session):
+        """
+        Commit the session, rolling back and raising a TypeError if that fails
+        """
+        try:
+            session.commit ()
+        except:
+            session.rollback ()
+            raise TypeError ("Failed to commit")
+        
+    @classmethod
+    def scan_for_updates (cls, directory, glob_string = '*', tags = None, template_name = None, log_info = False, bulk = False, batch_size = 1000, processes = None, index_file = None):
+        """
+        Scan the directory for files matching glob_string and add them to the database, using the directory index index_file if given (see scan_directory)
+        If bulk, use bulk_update_database, which only checks the entries of files in directory for deletion, committing every batch_size files and reading headers with processes processes; processes cannot be used without bulk
+        """
+        if not bulk and processes is not None and processes > 1:
+            raise ValueError ("Headers are only read by a pool of processes in bulk mode")
+        
         # Create a session
         session = Session ()
         
         if log_info:
             print ("Scanning for updates in", directory, "with", glob_string)
         
+        if bulk:
+            try:
+                cls.bulk_update_database (session, directory, glob_string, tags, template_name = template_name, log_info = log_info, batch_size = batch_size, processes = processes, index_file = index_file)
+            finally:
+                session.close ()
+            return
+        
         # Go through the database, searching for entries that match the current class and check whether the corresponding file has been deleted
         for entry in session.query (cls).all ():
             if not os.path.isfile (entry.file):
@@ -393,20 +737,14 @@ class FileEntry (object):
                     print ("File " + entry.file + " has been deleted: removing from database")
                 session.delete (entry)
         
-        # If any files match the glob string in the current directory, send them to update_database
-        for file in glob.glob (os.path.join (directory, glob_string)):
+        # If any files match the glob string in the directory or its subdirectories, send them to update_database
+        for file in scan_directory (directory, glob_string, index_file, cls.exclude):
             if log_info:
                 print ("File", file, "matches globstring")
-            cls.update_database (session, file, tags, template_name = template_name, log_info = log_info)
-            
-        # If any files match the glob string in any subdirectories, send them to update_database
-        for root, dirs, files in os.walk (directory):
-            for direct in dirs:
-                direct = os.path.join (root, direct)
-                if log_info:
-                    print ("Searching in " + direct + " for " + os.path.join (direct, glob_string))
-                for file in glob.glob (os.path.join (direct, glob_string)):
-                    cls.update_database (session, file, tags, template_name = template_name, log_info = log_info)
+            try:
+                cls.update_database (session, file, tags, template_name = template_name, log_info = log_info)
+            except Exception as e:
+                print ("Warning: Unable to read %s, skipping: %s" % (file, e))
         
         try:
             session.commit ()
@@ -416,6 +754,63 @@ class FileEntry (object):
         finally:
             session.close ()
     
+    @classmethod
+    def fill_cache (cls, session, entries, funcs, processes = None, batch_size = 100, log_info = False, **kwargs):
+        """
+        Cache the values of funcs, a dictionary of functions by cache name, for each of entries (a query or list of entries of cls), as the cache method of each entry would
+        
+        The values already cached for each batch of batch_size entries are found in one query, values cached from a different version of a function are deleted, and the data of each entry missing any values are loaded once (passing kwargs to get_data) to evaluate all of its missing functions. The new values of the batch are then inserted at once and committed
+        
+        If processes is more than one, the data are loaded and the functions evaluated by a pool of that many processes, so the functions must be picklable (e.g. defined at module level)
+        
+        A verbose keyword argument is taken to mean log_info rather than passed to get_data
+        """
+        if kwargs.pop ('verbose', False):
+            log_info = True
+        codes = {name: function_code (function) for name, function in funcs.items ()}
+        if isinstance (entries, sqlalchemy.orm.query.Query):
+            files = [file for file, in entries.with_entities (cls.file)]
+        else:
+            files = [entry.file for entry in entries]
+        # Drop repeated files, keeping their order
+        files = list (dict.fromkeys (files))
+        
+        executor = concurrent.futures.ProcessPoolExecutor (processes) if processes is not None and processes > 1 else None
+        try:
+            for batch in batches (files, batch_size):
+                cached = set ()
+                stale = []
+                for id, file, name, code in session.query (cls.Cache.id, cls.Cache.file, cls.Cache.name, cls.Cache.code).filter (cls.Cache.file.in_ (batch)).filter (cls.Cache.name.in_ (list (funcs))):
+                    if code == codes [name]:
+                        cached.add ((file, name))
+                    else:
+                        stale.append (id)
+                if len (stale) > 0:
+                    session.query (cls.Cache).filter (cls.Cache.id.in_ (stale)).delete (synchronize_session = False)
+                
+                missing = {}
+                for file in batch:
+                    functions = {name: function for name, function in funcs.items () if (file, name) not in cached}
+                    if len (functions) > 0:
+                        missing [file] = functions
+                
+                if executor is not None:
+                    results = executor.map (_evaluate_cache, [cls] * len (missing), list (missing), list (missing.values ()), [kwargs] * len (missing))
+                else:
+                    results = (_evaluate_cache (cls, file, functions, kwargs) for file, functions in missing.items ())
+                rows = []
+                for file, values in results:
+                    for name, (value, unit) in values.items ():
+                        rows.append ({'file': file, 'name': name, 'code': codes [name], 'value': value, 'unit': unit})
+                
+                session.bulk_insert_mappings (cls.Cache, rows)
+                cls._commit (session)
+                if log_info:
+                    print ("Cached %i values for %i files" % (len (rows), len (missing)))
+        finally:
+            if executor is not None:
+                executor.shutdown ()
+    
     @classmethod
     def cacheQuery (cls, name, query, function = None, label = None):
         if isinstance (name, ColumnElement) or isinstance (name, QueryableAttribute) or isinstance (name, FunctionElement):
@@ -437,6 +832,9 @@ class FileEntry (object):
 class DumpFileEntry (FileEntry, Base):
     __tablename__ = 'dumpfiles'
     
+    # The index files of dumps, which earlier versions of Dump wrote next to them under names matching the '#' globs of the dumps
+    exclude = ('*.kidx',)
+    
     timestep = sqlalchemy.Column (sqlalchemy.Integer)
     state = sqlalchemy.Column (sqlalchemy.String)
         
@@ -448,29 +846,48 @@ class DumpFileEntry (FileEntry, Base):
        
     def addToSimulation (self, simulationEntry):
         self.simulation = simulationEntry
+        self.updateSimulation (simulationEntry)
+        
+    def updateSimulation (self, simulationEntry):
         if not simulationEntry.loaded:
             simulationEntry.copy_parameters (self)
             simulationEntry.loaded = True
         simulationEntry.check_parameters (self)
         
     @classmethod
-    def genFromFile (cls, file):
+    def read_header (cls, file):
         d = Dump (file)
-        entry = DumpFileEntry (file = file, date = datetime.datetime.fromtimestamp (os.path.getmtime(file)), timestep = d.ncyc, state = d.getState ())
-        entry.set_parameters (d, pfile)
-        entry.set_parameters (d, qfile)
-        return entry, d.getRunId (), d.namep
+        parameters = cls.parameter_values (d, pfile)
+        parameters.update (cls.parameter_values (d, qfile))
+        return {'file': file, 'date': datetime.datetime.fromtimestamp (os.path.getmtime(file)), 'timestep': d.ncyc, 'state': d.getState (), 'parameters': parameters, 'runid': d.getRunId (), 'name': d.namep}
         
-    def set_parameters (self, dump, file):
+    @classmethod
+    def genFromHeader (cls, header):
+        entry = DumpFileEntry (file = header ['file'], date = header ['date'], timestep = header ['timestep'], state = header ['state'])
+        for name, value in header ['parameters'].items ():
+            setattr (entry, name, value)
+        return entry, header ['runid'], header ['name']
+        
+    @staticmethod
+    def parameter_values (dump, file):
+        """
+        Return a dictionary of the values in dump of the parameters listed in the parameter file
+        """
+        values = {}
         parameter_file = open (file, 'r')
         for line in parameter_file:
             words = line.split ('\t')
             if words [0] [0] == '#':
-                return
+                return values
             try:
-                setattr (self, words [1], dump.parameters [words [1]].value)
+                values [words [1]] = dump.parameters.getValue (words [1])
             except KeyError as e:
                 pass
+        return values
+        
+    def set_parameters (self, dump, file):
+        for name, value in self.parameter_values (dump, file).items ():
+            setattr (self, name, value)
         
     def get_data (self, cache = True, **kwargs):
         if self.dataobject is not None:
@@ -503,13 +920,19 @@ class CNVFileEntry (FileEntry, Base):
        return "<CNV File (name='%s')>" % (self.simulation.name)
         
     @classmethod
-    def genFromFile (cls, file):
-        name = os.path.basename (os.path.splitext (file) [0])
-        entry = CNVFileEntry (file = file, name = name, date = datetime.datetime.fromtimestamp (os.path.getmtime(file)))
-        return entry, None, name
+    def read_header (cls, file):
+        return {'file': file, 'date': datetime.datetime.fromtimestamp (os.path.getmtime(file)), 'runid': None, 'name': os.path.basename (os.path.splitext (file) [0])}
         
-    def get_data (self, cache = True, **kwargs):
+    @classmethod
+    def genFromHeader (cls, header):
+        entry = CNVFileEntry (file = header ['file'], name = header ['name'], date = header ['date'])
+        return entry, header ['runid'], header ['name']
+        
+    def get_data (self, cache = True, refresh = False, **kwargs):
         if self.dataobject is not None:
+            if refresh:
+                # Read only the models written since the cnv file was last read
+                self.dataobject.refresh ()
             return self.dataobject
         try:
             dataobject = CNVFile (self.file, **kwargs)
@@ -551,7 +974,7 @@ class Tag (Base):
 def basicQuery (session):
     return session.query (SimulationEntry, DumpFileEntry).join (DumpFileEntry)
 
-def cache (session, sims, funcs, states = ("presn")):
+def cache (session, sims, funcs, states = ("presn"), processes = None):
     dumps = [[sim.getStateDump (state) for state in states] for sim in sims]
     
     results = {}
@@ -562,6 +985,9 @@ def cache (session, sims, funcs, states = ("presn")):
     
     if len (dumps) == 0:
         raise RuntimeError ("No dumps exist in sims")
+    
+    # Evaluate all the missing values at once, so that each dump is loaded only once
+    DumpFileEntry.fill_cache (session, [dump for run in dumps for dump in run], funcs, processes = processes)
         
     for i, run in enumerate (dumps):
         for state, dump in zip (states, run):
@@ -576,7 +1002,7 @@ def cache (session, sims, funcs, states = ("presn")):
             
     return results
             
-def cnv_cache (session, sims, funcs):
+def cnv_cache (session, sims, funcs, processes = None):
     if isinstance (sims, sqlalchemy.orm.query.Query):
         sims = sims.all ()
         
@@ -584,6 +1010,7 @@ def cnv_cache (session, sims, funcs):
         sims = [sim for sim in sims]
         
     cnvs = [sim.cnvfiles [0] for sim in sims]
+    CNVFileEntry.fill_cache (session, cnvs, funcs, processes = processes, log_info = True)
     
     results = {}
     for name in funcs:
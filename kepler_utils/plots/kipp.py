@@ -71,7 +71,7 @@ class KippenhahnPlot(object):
         self.axis = axis
         self.cnv_file = cnv_file
         
-        self.times = (u.Quantity ([model ['timesec'] for model in self.cnv_file], 's').to ('year')).value
+        self.times = (self.cnv_file.column ('timesec') * self.cnv_file.unit ('timesec')).to ('year').value
         
         if (not useModels):
             self.x = self.times
@@ -101,7 +101,7 @@ class KippenhahnPlot(object):
         return self.xmax
         
     def plotMax (self, index, scale = 1.0, **kwargs):
-        return self.axis.plot (self.x, scale * np.array ([max (model [index]) for model in self.cnv_file]), **kwargs)
+        return self.axis.plot (self.x, scale * self.cnv_file.column (index).max (), **kwargs)
         
     def _distance (self, value1, value2, logspace = True):
         if logspace:
@@ -179,7 +179,7 @@ class KippenhahnPlot(object):
         
     def plotEnergy (self, points = 400, logspace = True, extent = None, **kwargs):
         # Calculate the maximum log10 value of energy gain/loss throughout the star to evenly balance the SymLog colorbar 
-        vmax = max ([max (model ['nuc']) if len (model ['nuc']) != 0 else 0 for model in self.cnv_file])
+        vmax = int (self.cnv_file.column ('nuc').max (0).max ())
 
         cmap = kwargs.pop ('cmap', plt.get_cmap ('coolwarm_r'))
         linewidth = kwargs.pop ('linewidth', 0.0)
@@ -190,7 +190,7 @@ class KippenhahnPlot(object):
         return self.plotRectangles ('inuc', 'nuc', False, get_value = (energyBin,), cmap = cmap, linewidth = linewidth, norm = norm, edgecolor = edgecolor, logspace = logspace, points = points, extent = extent)
         
     def addEnergyColorBar (self, energy):
-        vmax = max ([max (model ['nuc']) if len (model ['nuc']) != 0 else 0 for model in self.cnv_file])
+        vmax = int (self.cnv_file.column ('nuc').max (0).max ())
 
         # Add the color bar to the plot
         cb = plt.colorbar (energy)
@@ -252,6 +252,6 @@ def jTDPlot (cnv_record, logspace = True, extent = None, points = 400):
     plt.grid ()
     plt.legend ()
     
-    radii = u.Quantity ([model [-1] for model in cnv_record ['rncoord']])
+    radii = cnv_record.column ('rncoord').last () * cnv_record.unit ('rncoord')
     
     return fig, ax
\ No newline at end of file
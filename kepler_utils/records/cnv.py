@@ -1,8 +1,12 @@
-import fortranfile
+import collections
+import concurrent.futures
+import json
+import os
 import numpy
-import struct
 import astropy.units as u
 
+from kepler_utils.records.outputfile import OutputFile, int_kinds
+
 def selected_kind (kind_length):
     if kind_length == 4:
         return 2
@@ -10,223 +14,553 @@ def selected_kind (kind_length):
         return 1
     else:
         raise TypeError ("Unrecognized kind length %i" % kind_length)
-        
-class CNVFile:
+
+def _byte_index (starts, counts, size):
+    """
+    Return the indices of the bytes of counts [i] items of size bytes each, starting at starts [i], for every i
+    """
+    lengths = counts * size
+    firsts = numpy.cumsum (lengths) - lengths
+    return numpy.repeat (starts - firsts, lengths) + numpy.arange (lengths.sum ())
+
+def _gather (buffer, starts, counts, dtype):
+    """
+    Decode counts [i] values of numpy type dtype from buffer at each of starts into one flat array in native byte order
+    """
+    values = buffer [_byte_index (starts, counts, dtype.itemsize)].view (dtype)
+    return values.astype (dtype.newbyteorder ('='))
+
+def _gather_ints (buffer, starts, counts, kinds):
+    """
+    Decode counts [i] integers of kind length kinds [i] from buffer at each of starts into one flat array, decoding all the arrays of each kind at once
+    """
+    values = numpy.zeros (counts.sum (), dtype = int)
+    firsts = numpy.cumsum (counts) - counts
+    for kind in numpy.unique (kinds):
+        if kind not in int_kinds:
+            raise TypeError ("Unrecognized integer kind.")
+        models = kinds == kind
+        values [_byte_index (firsts [models], counts [models], 1)] = _gather (buffer, starts [models], counts [models], int_kinds [kind])
+    return values
+
+def _chunks (lengths, size):
+    """
+    Split records of the given lengths into runs of consecutive records of about size bytes, at least one record each; return the indices of the records of each run
+    """
+    return numpy.split (numpy.arange (len (lengths)), numpy.flatnonzero (numpy.diff (numpy.cumsum (lengths) // size)) + 1)
+
+def _join (decoded):
+    """
+    Join the scalars and arrays decoded from consecutive runs of records, in order, dropping the pieces of each keyword once it is joined
+    """
+    if len (decoded) == 1:
+        return decoded [0]
+    scalars = numpy.concatenate ([chunk_scalars for chunk_scalars, chunk_arrays in decoded])
+    arrays = collections.OrderedDict ()
+    for name in list (decoded [0] [1]):
+        arrays [name] = RaggedArray.concatenate ([chunk_arrays.pop (name) for chunk_scalars, chunk_arrays in decoded])
+    return scalars, arrays
+
+def _decode_records (file_name, starts, ends):
+    """
+    Read and decode the records at starts through ends of the cnv file file_name, as CNVFile._decode does; run by the processes of a CNVFile's process pool
+    """
+    with OutputFile (file_name) as reader:
+        return CNVFile._decode (reader, starts, ends)
+
+class RaggedArray (object):
+    """
+    A variable-length array for each model, stored as one flat array of all the models' values and the offsets at which each model's values start
+    
+    Indexing gives the values of a model as a view into the flat array, and reductions over every model are single numpy calls
+    """
+    def __init__ (self, values, offsets):
+        self.values = values
+        self.offsets = offsets
+    
+    def __len__ (self):
+        return len (self.offsets) - 1
+    
+    def __iter__ (self):
+        for i in range (len (self)):
+            yield self [i]
+    
+    def __getitem__ (self, index):
+        if isinstance (index, slice):
+            return [self [i] for i in range (*index.indices (len (self)))]
+        if index < 0:
+            index += len (self)
+        return self.values [self.offsets [index]:self.offsets [index + 1]]
+    
+    @classmethod
+    def concatenate (cls, arrays):
+        """
+        Join the models of several RaggedArray objects into one, in order
+        """
+        offsets = [numpy.zeros (1, dtype = int)]
+        total = 0
+        for array in arrays:
+            offsets.append (array.offsets [1:] - array.offsets [0] + total)
+            total += array.offsets [-1] - array.offsets [0]
+        return cls (numpy.concatenate ([array.values [array.offsets [0]:array.offsets [-1]] for array in arrays]), numpy.concatenate (offsets))
+    
+    def lengths (self):
+        """
+        Return the number of values of each model
+        """
+        return numpy.diff (self.offsets)
+    
+    def first (self, empty = numpy.nan):
+        """
+        Return the first value of each model, or empty for models without values
+        """
+        result = numpy.full (len (self), empty, dtype = numpy.result_type (self.values, empty))
+        full = self.lengths () > 0
+        result [full] = self.values [self.offsets [:-1] [full]]
+        return result
+    
+    def last (self, empty = numpy.nan):
+        """
+        Return the last value of each model, or empty for models without values
+        """
+        result = numpy.full (len (self), empty, dtype = numpy.result_type (self.values, empty))
+        full = self.lengths () > 0
+        result [full] = self.values [self.offsets [1:] [full] - 1]
+        return result
+    
+    def reduce (self, ufunc, empty = numpy.nan):
+        """
+        Return the reduction of the values of each model by the numpy ufunc, or empty for models without values
+        """
+        result = numpy.full (len (self), empty, dtype = numpy.result_type (self.values, empty))
+        full = self.lengths () > 0
+        if numpy.any (full):
+            result [full] = ufunc.reduceat (self.values, self.offsets [:-1] [full])
+        return result
+    
+    def max (self, empty = numpy.nan):
+        """
+        Return the largest value of each model, or empty for models without values
+        """
+        return self.reduce (numpy.maximum, empty)
+
+class CNVModels (object):
+    """
+    The models of a CNVFile as a sequence of dictionaries, each holding all the cnv file keywords for a given record
+    
+    A model's dictionary is only assembled from the columns of the CNVFile when the model is first accessed
+    """
+    def __init__ (self, cnv_file):
+        self.cnv_file = cnv_file
+        self.models = [None] * len (cnv_file.scalars)
+    
+    def __len__ (self):
+        return len (self.models)
+    
+    def __iter__ (self):
+        for i in range (len (self)):
+            yield self [i]
+    
+    def __getitem__ (self, index):
+        if isinstance (index, slice):
+            return [self [i] for i in range (*index.indices (len (self)))]
+        if self.models [index] is None:
+            self.models [index] = self.cnv_file._model (index % len (self))
+        return self.models [index]
+
+class CNVFile (OutputFile):
     """
     This class reads a KEPLER cnv file into memory.
     
-    It requires a file_name parameter, and can be given a maximum model number to read as well.
+    It requires a file_name parameter, and can be given a maximum model number to read as well. The records are located and read with the readers of OutputFile, which check that each record's markers match.
     
-    This object stores the cnv file as a list of dictionaries, each holding all the cnv file keywords for a given record. Indexing the object indexes that list.
+    The file is first scanned for its model index, self.index: the byte positions of the start and end of each record, with its cycle number and time, read by seeking from one record marker to the next. If use_index, the model index is saved to a hidden .kidx index file next to the cnv file and reused while the file is unchanged. Only the records of the selected models are then read from the file, seeking over the others; self.selection holds the number in the file of each model read. The models can be selected with:
+    
+    - max_model, the number of the last model to read
+    - time_window, a pair of times (t0, t1); only the models between them are read
+    - every, to read only every Nth model of the file
+    - log_points, to read about that many models evenly spaced in the logarithm of the time left before the end of the last model, as in a Kippenhahn plot
+    
+    refresh () reads only the models written since the file was last read, continuing the index from the end of the last complete record with the time reset state, self.tbase, reached there; it can be called repeatedly to follow the cnv file of a running simulation.
+    
+    If processes is more than one, the chunks of the selected records are decoded in parallel by a pool of that many processes, each reading its chunks from the file itself, and then joined; the model index is still built first, so the time resets are corrected across the chunks.
+    
+    Columns extracted by indexing with a keyword are cached until the file is read again; if max_columns is given, only that many of the most recently used columns are kept.
+    
+    The records of all the models are decoded together, chunk_size bytes of records at a time: the fixed-layout keywords are stored in self.scalars, a numpy structured array, and the variable-length keywords in self.arrays as RaggedArray objects. self.models presents these as a list of dictionaries, each holding all the cnv file keywords for a given record, with the variable-length keywords as views into self.arrays. Indexing the object indexes that list.
     """
     
-    def __init__ (self, file_name, max_model = None, verbose = False):
+    # The keywords at the start of each record, after the record marker
+    head_type = numpy.dtype ([('version', '>i4'), ('ncyc', '>i4'), ('timesec', '>f8'), ('dt', '>f8')] + [(name, '>i4') for name in ('nconv', 'nnuc', 'nnuk', 'nneu', 'nnucd', 'nnukd', 'nneud', 'ncoord', 'idx_kind_len', 'nuc_kind_len')])
+    
+    # The keywords at the end of each record, before the record marker
+    tail_type = numpy.dtype ([(name, '>i4') for name in ('levcnv', 'minloss', 'mingain', 'minnucl', 'minnucg', 'minneul', 'minneug', 'minlossd', 'mingaind', 'minnucld', 'minnucgd', 'minneuld', 'minneugd')] +
+        [(name, '>f8') for name in ('tc_cnv', 'dc_cnv', 'pc_cnv', 'ec_cnv', 'sc_cnv', 'ye_cnv', 'ab_cnv', 'et_cnv', 'sn_cnv', 'su_cnv', 'g1_cnv', 'g2_cnv', 's1_cnv', 's2_cnv', 'aw_cnv', 'summ0', 'radius0', 'an_cnv')] +
+        [('abun_cnv', '>f8', (20,))] +
+        [(name, '>f8') for name in ('eni_cnv', 'enk_cnv', 'enp_cnv', 'ent_cnv', 'epro_cnv', 'enn_cnv', 'enr_cnv', 'ensc_cnv', 'enes_cnv', 'enc_cnv', 'enpist_cnv', 'enid_cnv', 'enkd_cnv', 'enpd_cnv', 'entd_cnv', 'eprod_cnv', 'xlumn_cnv', 'enrd_cnv', 'enscd_cnv', 'enesd_cnv', 'encd_cnv', 'enpistd_cnv', 'xlum_cnv', 'xlum0_cnv', 'entloss_cnv', 'eniloss_cnv', 'enkloss_cnv', 'enploss_cnv', 'enrloss_cnv', 'angit_cnv', 'anglt_cnv', 'xmacc_cnv')])
+    
+    # The variable-length keywords between them, in order, with the keyword that gives their length and their type: 'nuc' or 'idx' for integers of kind nuc_kind_len or idx_kind_len, 'double', or 'char'
+    # The integer ladv is read in between them
+    array_layout = [('nuc', 'nnuc', 'nuc'), ('nuk', 'nnuk', 'nuc'), ('neu', 'nneu', 'nuc'), ('nucd', 'nnucd', 'nuc'), ('nukd', 'nnukd', 'nuc'), ('neud', 'nneud', 'nuc'),
+        ('yzip', 'nconv', 'char'), ('xmcoord', 'ncoord', 'double'), ('rncoord', 'ncoord', 'double'),
+        ('ladv', None, None), ('iadv', 'ladv', 'idx'), ('dmadv', 'ladv', 'double'), ('dvadv', 'ladv', 'double'),
+        ('inuc', 'nnuc', 'idx'), ('inuk', 'nnuk', 'idx'), ('ineu', 'nneu', 'idx'), ('inucd', 'nnucd', 'idx'), ('inukd', 'nnukd', 'idx'), ('ineud', 'nneud', 'idx'), ('iconv', 'nconv', 'idx')]
+    
+    # The number of bytes of records read and decoded at once; decoding takes several times this in byte indices
+    chunk_size = 1 << 22
+    
+    def __init__ (self, file_name, max_model = None, verbose = False, max_columns = None, use_index = False, time_window = None, every = None, log_points = None, processes = None):
         if verbose:
             print ("Reading CNVFile from", file_name)
-        self.models = []
         self.units = {}
         self.units ['dt'] = u.s
         self.units ['timesec'] = u.s
         self.units ['xmcoord'] = u.g
         self.units ['rncoord'] = u.cm
         self.units ['xlum_cnv'] = u.erg / u.s
-        self.file = fortranfile.FortranFile (file_name)
-        i = 0
-        tbase = 0.0
-        while (True):
-#             print ("Attempting iteration %i" % i)
-            try:
-                self.read_int ()
-                version = self.read_int ()
-            except struct.error:
-                # print ("End of file.")
-                return
-            
-#             print ("Found version, filling variables...")
-
-            if version != 10500 and version != 0:
-                raise TypeError ("Can't handle version type %i" % version)
-            ncyc = self.read_int ()
-            timesec = self.read_double ()
-            dt = self.read_double ()
-                        
-            if (i > 1):
-                if timesec + tbase < self [-1] ['timesec']:
-                    tbase = self [-1] ['timesec']
-                    # print ("Time reset at %d." % i)
-                    # return
-                
-            self.models.append ({})
-            timesec += tbase 
-            self [i] ['ncyc'] = ncyc
-            self [i] ['timesec'] = timesec
-            self [i] ['dt'] = dt
-
-            self [i] ['nconv'] = self.read_int ()
-            self [i] ['nnuc'] = self.read_int ()
-            self [i] ['nnuk'] = self.read_int ()
-            self [i] ['nneu'] = self.read_int ()
-            self [i] ['nnucd'] = self.read_int ()
-            self [i] ['nnukd'] = self.read_int ()
-            self [i] ['nneud'] = self.read_int ()
-            self [i] ['ncoord'] = self.read_int ()
-            self [i] ['idx_kind_len'] = self.read_int ()
-            self [i] ['nuc_kind_len'] = self.read_int ()
-
-            self [i] ['nuc'] = self.read_ints (self [-1] ['nnuc'], self [-1] ['nuc_kind_len'])
-            self [i] ['nuk'] = self.read_ints (self [-1] ['nnuk'], self [-1] ['nuc_kind_len'])
-            self [i] ['neu'] = self.read_ints (self [-1] ['nneu'], self [-1] ['nuc_kind_len'])
-            self [i] ['nucd'] = self.read_ints (self [-1] ['nnucd'], self [-1] ['nuc_kind_len'])
-            self [i] ['nukd'] = self.read_ints (self [-1] ['nnukd'], self [-1] ['nuc_kind_len'])
-            self [i] ['neud'] = self.read_ints (self [-1] ['nneud'], self [-1] ['nuc_kind_len'])
-            self [i] ['yzip'] = self.read_chars (self [-1] ['nconv'])
-            self [i] ['xmcoord'] = self.read_doubles (self [-1] ['ncoord'])
-            self [i] ['rncoord'] = self.read_doubles (self [-1] ['ncoord'])
-
-            self [i] ['ladv'] = self.read_int ()
-            self [i] ['iadv'] = self.read_ints (self [-1] ['ladv'], self [-1] ['idx_kind_len'])
-            self [i] ['dmadv'] = self.read_doubles (self [-1] ['ladv'])
-            self [i] ['dvadv'] = self.read_doubles (self [-1] ['ladv'])
-
-            self [i] ['inuc'] = self.read_ints (self [-1] ['nnuc'], self [-1] ['idx_kind_len'])
-            self [i] ['inuk'] = self.read_ints (self [-1] ['nnuk'], self [-1] ['idx_kind_len'])
-            self [i] ['ineu'] = self.read_ints (self [-1] ['nneu'], self [-1] ['idx_kind_len'])
-            self [i] ['inucd'] = self.read_ints (self [-1] ['nnucd'], self [-1] ['idx_kind_len'])
-            self [i] ['inukd'] = self.read_ints (self [-1] ['nnukd'], self [-1] ['idx_kind_len'])
-            self [i] ['ineud'] = self.read_ints (self [-1] ['nneud'], self [-1] ['idx_kind_len'])
-            self [i] ['iconv'] = self.read_ints (self [-1] ['nconv'], self [-1] ['idx_kind_len'])
-
-            self [i] ['levcnv'] = self.read_int ()
-            self [i] ['minloss'] = self.read_int ()
-            self [i] ['mingain'] = self.read_int ()
-            self [i] ['minnucl'] = self.read_int ()
-            self [i] ['minnucg'] = self.read_int ()
-            self [i] ['minneul'] = self.read_int ()
-            self [i] ['minneug'] = self.read_int ()
-
-            self [i] ['minlossd'] = self.read_int ()
-            self [i] ['mingaind'] = self.read_int ()
-            self [i] ['minnucld'] = self.read_int ()
-            self [i] ['minnucgd'] = self.read_int ()
-            self [i] ['minneuld'] = self.read_int ()
-            self [i] ['minneugd'] = self.read_int ()
-
-            self [i] ['tc_cnv'] = self.read_double ()
-            self [i] ['dc_cnv'] = self.read_double ()
-            self [i] ['pc_cnv'] = self.read_double ()
-            self [i] ['ec_cnv'] = self.read_double ()
-            self [i] ['sc_cnv'] = self.read_double ()
-            self [i] ['ye_cnv'] = self.read_double ()
-            self [i] ['ab_cnv'] = self.read_double ()
-
-            self [i] ['et_cnv'] = self.read_double ()
-            self [i] ['sn_cnv'] = self.read_double ()
-            self [i] ['su_cnv'] = self.read_double ()
-            self [i] ['g1_cnv'] = self.read_double ()
-            self [i] ['g2_cnv'] = self.read_double ()
-            self [i] ['s1_cnv'] = self.read_double ()
-            self [i] ['s2_cnv'] = self.read_double ()
-
-            self [i] ['aw_cnv'] = self.read_double ()
-            self [i] ['summ0'] = self.read_double ()
-            self [i] ['radius0'] = self.read_double ()
-            self [i] ['an_cnv'] = self.read_double ()
-
-            self [i] ['abun_cnv'] = self.read_doubles (20)
-
-            self [i] ['eni_cnv'] = self.read_double ()
-            self [i] ['enk_cnv'] = self.read_double ()
-            self [i] ['enp_cnv'] = self.read_double ()
-            self [i] ['ent_cnv'] = self.read_double ()
-            self [i] ['epro_cnv'] = self.read_double ()
-            self [i] ['enn_cnv'] = self.read_double ()
-            self [i] ['enr_cnv'] = self.read_double ()
-            self [i] ['ensc_cnv'] = self.read_double ()
-            self [i] ['enes_cnv'] = self.read_double ()
-            self [i] ['enc_cnv'] = self.read_double ()
-            self [i] ['enpist_cnv'] = self.read_double ()
-            self [i] ['enid_cnv'] = self.read_double ()
-            self [i] ['enkd_cnv'] = self.read_double ()
-            self [i] ['enpd_cnv'] = self.read_double ()
-            self [i] ['entd_cnv'] = self.read_double ()
-            self [i] ['eprod_cnv'] = self.read_double ()
-            self [i] ['xlumn_cnv'] = self.read_double ()
-            self [i] ['enrd_cnv'] = self.read_double ()
-            self [i] ['enscd_cnv'] = self.read_double ()
-            self [i] ['enesd_cnv'] = self.read_double ()
-            self [i] ['encd_cnv'] = self.read_double ()
-            self [i] ['enpistd_cnv'] = self.read_double ()
-            self [i] ['xlum_cnv'] = self.read_double ()
-            self [i] ['xlum0_cnv'] = self.read_double ()
-            self [i] ['entloss_cnv'] = self.read_double ()
-            self [i] ['eniloss_cnv'] = self.read_double ()
-            self [i] ['enkloss_cnv'] = self.read_double ()
-            self [i] ['enploss_cnv'] = self.read_double ()
-            self [i] ['enrloss_cnv'] = self.read_double ()
-            self [i] ['angit_cnv'] = self.read_double ()
-            self [i] ['anglt_cnv'] = self.read_double ()
-            self [i] ['xmacc_cnv'] = self.read_double ()
-            self.read_int ()
-            i += 1
-            if max_model != None and i > max_model:
-                return
-        
-    def read_int (self, kind_length = 8):
-        if kind_length == 8:
-            return struct.unpack ('>' + str (1) + 'i', self.file.read (4)) [0]
-        if kind_length == 4:
-            return struct.unpack ('>' + str (1) + 'h', self.file.read (2)) [0]
-        if kind_length == 2:
-            return struct.unpack ('>' + str (1) + 'b', self.file.read (1)) [0]
-        raise TypeError ("Unrecognized integer kind.")
-
-    def read_double (self, kind = 8):
-        return struct.unpack ('>' + str (1) + 'd', self.file.read (8)) [0]
-    
-    def read_ints (self, num, kind_length = 8):
-        if kind_length == 8:
-            return list (struct.unpack ('>' + str (num) + 'i', self.file.read (num * 4)))
-        if kind_length == 4:
-            return list (struct.unpack ('>' + str (num) + 'h', self.file.read (num * 2)))
-        if kind_length == 2:
-            return list (struct.unpack ('>' + str (num) + 'b', self.file.read (num)))
+        super (CNVFile, self).__init__ (file_name)
+        self.max_columns = max_columns
+        self.use_index = use_index
+        self.processes = processes
+        self._read (max_model, time_window, every, log_points)
+        self.models = CNVModels (self)
+    
+    def _read (self, max_model = None, time_window = None, every = None, log_points = None):
+        """
+        Read in the selected records and decode them all at once
+        
+        :type max_model: :class:`int`
+        :param max_model: If not None, the number of the last model to read
+        
+        :param time_window: If not None, a pair of times (astropy quantities, or floats in seconds); only the models between them are read
+        
+        :type every: :class:`int`
+        :param every: If not None, only every Nth model is read
+        
+        :type log_points: :class:`int`
+        :param log_points: If not None, only about this many models are read, evenly spaced in the logarithm of the time before the end
+        """
+        self.max_model = max_model
+        self.time_window = time_window
+        self.every = every
+        self.log_points = log_points
+        if not (self.use_index and self.load_index ()):
+            self.index = {'starts': numpy.zeros (0, dtype = int), 'ends': numpy.zeros (0, dtype = int), 'ncyc': numpy.zeros (0, dtype = int), 'timesec': numpy.zeros (0)}
+            self.tbase = 0.0
+            self._index_records (max_model)
+            if self.use_index and max_model is None:
+                self.save_index ()
+        
+        self.selection = self._select (numpy.arange (len (self.index ['starts'])))
+        self.scalars, self.arrays = self._decode_models (self.selection)
+        self._reset_lookups ()
+    
+    def refresh (self):
+        """
+        Read the models appended to the file since it was last read, as KEPLER writes them, and return how many were added
+        Only the new records are read; a partially written last record is left for the next refresh. If the file has shrunk, it is read again from the start
+        """
+        end = self.index ['ends'] [-1] if len (self.index ['ends']) > 0 else 0
+        if os.path.getsize (self.file_name) < end:
+            self._read (self.max_model, self.time_window, self.every, self.log_points)
+            self.models = CNVModels (self)
+            return len (self)
+        
+        models = self._index_records (self.max_model)
+        if self.use_index and self.max_model is None and len (models) > 0:
+            self.save_index ()
+        if self.log_points is not None:
+            # The models kept depend on the time of the last model, so they are all chosen again
+            self.selection = self._select (numpy.arange (len (self.index ['starts'])))
+            self.scalars, self.arrays = self._decode_models (self.selection)
+            self.models = CNVModels (self)
+            self._reset_lookups ()
+            return int (numpy.isin (models, self.selection).sum ())
+        models = self._select (models)
+        if len (models) == 0:
+            return 0
+        
+        scalars, arrays = self._decode_models (models)
+        self.selection = numpy.concatenate ((self.selection, models))
+        self.scalars = numpy.concatenate ((self.scalars, scalars))
+        self.arrays = collections.OrderedDict ((name, RaggedArray.concatenate ((self.arrays [name], arrays [name]))) for name in arrays)
+        self.models.models.extend ([None] * len (models))
+        self._reset_lookups ()
+        return len (models)
+    
+    def _select (self, models):
+        """
+        Return those of the numbers of models in the file that are selected by max_model, time_window, every and log_points
+        """
+        if self.max_model is not None:
+            models = models [models <= self.max_model]
+        if self.time_window is not None:
+            t0, t1 = (u.Quantity (t, u.s).value for t in self.time_window)
+            times = self.index ['timesec'] [models]
+            models = models [(times >= t0) & (times <= t1)]
+        if self.every is not None:
+            models = models [models % self.every == 0]
+        if self.log_points is not None and len (models) > 1:
+            times = self.index ['timesec'] [models]
+            # End the run a step after its last model, as KippenhahnPlot does, so the last model is a finite distance from the end
+            steps = numpy.diff (times) [numpy.diff (times) > 0]
+            tend = times [-1] + (steps [-1] if len (steps) > 0 else 1.0)
+            distances = numpy.log10 (numpy.maximum (tend - times, tend - times [-1]))
+            spacing = (distances [0] - distances [-1]) / self.log_points
+            if spacing > 0:
+                # Keep the first model in each interval of the spacing
+                models = models [numpy.sort (numpy.unique (numpy.floor ((distances [0] - distances) / spacing), return_index = True) [1])]
+        return models
+    
+    def _decode_models (self, models):
+        """
+        Read and decode the records of the given numbers of models in the file; return their scalars and arrays, with timesec taken from the model index
+        """
+        starts, ends = self.index ['starts'] [models], self.index ['ends'] [models]
+        if self.processes is None or self.processes < 2 or len (models) < 2:
+            scalars, arrays = _decode_records (self.file_name, starts, ends)
         else:
-            raise TypeError ("Unrecognized integer kind.")
+            # Only the positions of each chunk of records are sent; each process reads and decodes its chunks from the file itself, and the chunks are joined in order
+            chunks = _chunks (ends - starts, self.chunk_size)
+            with concurrent.futures.ProcessPoolExecutor (self.processes) as executor:
+                scalars, arrays = _join (list (executor.map (_decode_records, [self.file_name] * len (chunks), [starts [chunk] for chunk in chunks], [ends [chunk] for chunk in chunks])))
+        # The times are corrected for resets in the model index, across the chunks
+        scalars ['timesec'] = self.index ['timesec'] [models]
+        return scalars, arrays
     
-    def read_doubles (self, num, kind = 8):
-        x = self.file.read (num * kind)
-        return list (struct.unpack ('>' + str (num) + 'd', x))
+    def _reset_lookups (self):
+        """
+        Clear the cached columns, and note whether the times and cycle numbers of the models increase so that modelNear and model_for_cycle can search them
+        """
+        self.columns = collections.OrderedDict ()
+        self.times_sorted = bool (numpy.all (numpy.diff (self.scalars ['timesec']) >= 0))
+        self.cycles_sorted = bool (numpy.all (numpy.diff (self.scalars ['ncyc']) >= 0))
     
-    def read_chars (self, num):
-        return self.file.read (num).decode ('utf-8')
+    @classmethod
+    def _decode (cls, reader, starts, ends):
+        """
+        Read and decode the records at starts through ends with reader, an open OutputFile, chunk_size bytes of records at a time; return a structured array of their fixed-layout keywords and a RaggedArray of each variable-length keyword
+        timesec is left as written in the records
+        """
+        return _join ([cls._decode_buffer (*reader._read_spans (starts [chunk], ends [chunk])) for chunk in _chunks (ends - starts, cls.chunk_size)])
+    
+    @classmethod
+    def _decode_buffer (cls, buffer, starts, ends):
+        """
+        Decode the records at starts through ends in buffer, as _decode does
+        """
+        head = buffer [starts [:, numpy.newaxis] + 4 + numpy.arange (cls.head_type.itemsize)].view (cls.head_type) [:, 0]
+        tail = buffer [ends [:, numpy.newaxis] - 4 - cls.tail_type.itemsize + numpy.arange (cls.tail_type.itemsize)].view (cls.tail_type) [:, 0]
+        
+        bad = (head ['version'] != 10500) & (head ['version'] != 0)
+        if numpy.any (bad):
+            raise TypeError ("Can't handle version type %i" % head ['version'] [bad] [0])
+        
+        # Decode the variable-length keywords, walking a cursor through every record at once
+        cursor = starts + 4 + cls.head_type.itemsize
+        counts = {name: head [name].astype (int) for name in head.dtype.names}
+        arrays = collections.OrderedDict ()
+        for name, count, kind in cls.array_layout:
+            if count is None:
+                counts [name] = _gather (buffer, cursor, numpy.ones (len (cursor), dtype = int), int_kinds [8]).astype (int)
+                cursor = cursor + 4
+                continue
+            if kind == 'double':
+                values = _gather (buffer, cursor, counts [count], numpy.dtype ('>f8'))
+                size = 8
+            elif kind == 'char':
+                values = buffer [_byte_index (cursor, counts [count], 1)].view ('S1')
+                size = 1
+            else:
+                values = _gather_ints (buffer, cursor, counts [count], counts [kind + '_kind_len'])
+                size = counts [kind + '_kind_len'] // 2
+            arrays [name] = RaggedArray (values, numpy.concatenate (([0], numpy.cumsum (counts [count]))))
+            cursor = cursor + counts [count] * size
+        
+        if numpy.any (cursor != ends - 4 - cls.tail_type.itemsize):
+            raise TypeError ("Record lengths do not match their contents")
+        
+        # Gather the fixed-layout keywords into one structured array, in the order they appear in the record
+        names = cls.head_type.names [1:]
+        fields = [(name, head.dtype [name].newbyteorder ('=')) for name in names] + [('ladv', int)] + [(name, tail.dtype [name].base.newbyteorder ('='), tail.dtype [name].shape) for name in tail.dtype.names]
+        scalars = numpy.zeros (len (starts), dtype = fields)
+        for name in names:
+            scalars [name] = head [name]
+        scalars ['ladv'] = counts ['ladv']
+        for name in tail.dtype.names:
+            scalars [name] = tail [name]
+        return scalars, arrays
+    
+    def _index_records (self, max_model = None):
+        """
+        Add the complete records after the end of the model index to it, and return their numbers in the file
+        
+        :type max_model: :class:`int`
+        :param max_model: If not None, the number of the last model to index
+        """
+        first = len (self.index ['starts'])
+        position = self.index ['ends'] [-1] if first > 0 else 0
+        previous = self.index ['timesec'] [-1] if first > 0 else 0.0
+        starts, ends, head = self._scan_records (position, None if max_model is None else max_model + 1 - first)
+        times, self.tbase = self._reset_times (head ['timesec'], first, self.tbase, previous)
+        for name, values in (('starts', starts), ('ends', ends), ('ncyc', head ['ncyc'].astype (int)), ('timesec', times)):
+            self.index [name] = numpy.concatenate ((self.index [name], values))
+        return numpy.arange (first, first + len (starts))
+    
+    def _scan_records (self, position = 0, count = None):
+        """
+        Locate the complete records of the file from position on, seeking from one record marker to the next; return the byte positions of their starts and ends, and a structured array of the keywords at the start of each
+        A record that is not yet completely written ends the scan; mismatched record markers raise a TypeError
+        
+        :type count: :class:`int`
+        :param count: If not None, the largest number of records to locate
+        """
+        with self:
+            starts, ends, heads = self._records (position, count, self.head_type.itemsize)
+        return starts, ends, numpy.frombuffer (b''.join (heads), dtype = self.head_type)
+    
+    def _reset_times (self, times, first = 0, tbase = 0.0, previous = 0.0):
+        """
+        Return timesec made to increase through the run, and the time added to the last model; when KEPLER resets the time, add the time at which it was reset to the following models
+        
+        :param first: The number in the file of the first model of times
+        :param tbase: The time added to the model before it
+        :param previous: The time of the model before it, after the addition
+        """
+        times = times.tolist ()
+        for i in range (len (times)):
+            if first + i >= 2 and times [i] + tbase < previous:
+                tbase = previous
+            times [i] += tbase
+            previous = times [i]
+        return numpy.array (times, dtype = float), tbase
+    
+    def _index_key (self):
+        """
+        Return the values that identify this version of the cnv file; an index is only valid for a file with the same key
+        """
+        return {'size': os.path.getsize (self.file_name), 'mtime': os.path.getmtime (self.file_name)}
+    
+    def load_index (self):
+        """
+        Load the model index from the .kidx index file of the cnv file; return whether a valid index file was found
+        """
+        try:
+            with open (self._index_file_name (), 'r') as file:
+                saved = json.load (file)
+        except (IOError, ValueError):
+            return False
+        if saved.get ('key') != self._index_key ():
+            return False
+        self.index = {'starts': numpy.array (saved ['models'] ['starts'], dtype = int), 'ends': numpy.array (saved ['models'] ['ends'], dtype = int),
+            'ncyc': numpy.array (saved ['models'] ['ncyc'], dtype = int), 'timesec': numpy.array (saved ['models'] ['timesec'], dtype = float)}
+        self.tbase = saved ['tbase']
+        return True
+    
+    def save_index (self):
+        """
+        Write the model index to the .kidx index file of the cnv file
+        """
+        with open (self._index_file_name (), 'w') as file:
+            json.dump ({'key': self._index_key (), 'tbase': self.tbase, 'models': {name: values.tolist () for name, values in self.index.items ()}}, file)
+    
+    def _model (self, index):
+        """
+        Assemble the dictionary of the keywords of the model at index
+        """
+        scalars = self.scalars [index]
+        model = {}
+        for name in self.head_type.names [1:]:
+            model [name] = scalars [name].item ()
+        for name, count, kind in self.array_layout:
+            if count is None:
+                model [name] = scalars [name].item ()
+                continue
+            values = self.arrays [name] [index]
+            model [name] = values.tobytes ().decode ('utf-8') if kind == 'char' else values
+        for name in self.tail_type.names:
+            model [name] = scalars [name].tolist ()
+        return model
     
     def __getitem__ (self, index):
         if isinstance (index, str):
-            if index in self.units:
-                units = self.units [index]
-            else:
-                units = "1"
-            if (type (self.models [0] [index]) == str):
-                return [model [index] for model in self.models]
-            if (type (self.models [0] [index]) == int):
-                return [model [index] for model in self.models]
-            x = [u.Quantity (model [index], units) for model in self.models]
-            try:
-                x = u.Quantity (x)
-            except TypeError:
-                pass
-            return x
+            if index in self.columns:
+                self.columns.move_to_end (index)
+                return self.columns [index]
+            self.columns [index] = self._extract (index)
+            if self.max_columns is not None and len (self.columns) > self.max_columns:
+                # Evict the least recently used column
+                self.columns.popitem (last = False)
+            return self.columns [index]
         return self.models [index]
     
+    def _extract (self, index):
+        """
+        Extract the keyword index from every model, with units if it is a number or array of numbers
+        """
+        if index in self.arrays and self.arrays [index].values.dtype.kind == 'S':
+            return [model [index] for model in self.models]
+        if index in self.scalars.dtype.names and self.scalars.dtype [index].kind == 'i':
+            return self.scalars [index].tolist ()
+        units = self.unit (index)
+        x = self.column (index)
+        if isinstance (x, numpy.ndarray):
+            return u.Quantity (x, units)
+        x = [u.Quantity (model, units) for model in x]
+        try:
+            x = u.Quantity (x)
+        except (TypeError, ValueError):
+            pass
+        return x
+    
+    def column (self, name):
+        """
+        Return the values of the keyword name in every model without units, as a numpy array if the keyword is a number and a RaggedArray if it is an array
+        Units can be attached afterward from self.unit (name)
+        
+        :type name: :class:`str`
+        """
+        if name in self.scalars.dtype.names:
+            return self.scalars [name]
+        if name in self.arrays:
+            return self.arrays [name]
+        raise KeyError (name)
+    
+    def unit (self, name):
+        """
+        Return the astropy unit of the keyword name
+        
+        :type name: :class:`str`
+        """
+        return u.Unit (self.units.get (name, 1))
+    
     def __iter__ (self):
         return iter (self.models)
-        
+    
     def __len__ (self):
         return len (self.models)
-        
+    
     def modelNear (self, time):
-        for i, model in enumerate (self):
-            if model ["timesec"] * u.s > time:
-                return i
-        return len (self) - 1
-        
\ No newline at end of file
+        """
+        Return the index of the first model after time, or of the last model if there is none
+        """
+        return self._first_after (self.scalars ['timesec'], u.Quantity (time, u.s).value, self.times_sorted, 'right')
+    
+    def model_for_cycle (self, ncyc):
+        """
+        Return the index of the first model with a cycle number of at least ncyc, or of the last model if there is none
+        
+        :type ncyc: :class:`int`
+        """
+        return self._first_after (self.scalars ['ncyc'], ncyc, self.cycles_sorted, 'left')
+    
+    def _first_after (self, values, value, is_sorted, side):
+        """
+        Return the index of the first of values after value (side 'right') or not before it (side 'left'), or the last index if there is none; a binary search if is_sorted
+        """
+        if is_sorted:
+            index = numpy.searchsorted (values, value, side = side)
+        else:
+            later = numpy.flatnonzero (values > value if side == 'right' else values >= value)
+            index = later [0] if len (later) > 0 else len (values)
+        return int (min (index, len (values) - 1))
@@ -1,34 +1,89 @@
 import os
 import time
-import re
+import json
+import shutil
+import tempfile
+import collections
 
-import fortranfile
 import numpy as np
-import struct
 import pandas
 import astropy.units as u
 import astropy.constants as consts
 import periodictable
 
+from kepler_utils.records.outputfile import OutputFile, int_kinds as intKinds, real_kinds as realKinds, decode_chars as _decodeChars
+
 __location__ = os.path.realpath (os.path.join (os.getcwd (), os.path.dirname (__file__)))
 
 pfile = os.path.realpath (os.path.join (__location__, "parameters.dat"))
 qfile = os.path.realpath (os.path.join (__location__, "qparameters.dat"))
 
+def _ionPositions (ionn, numIons):
+    """
+    Given the numbers (starting from 1) of the ions in each network, return an array whose [net, ion] element is the position of ion in the ppn data of network net, or -1 if the network does not include it
+    """
+    positions = np.full ((len (ionn), numIons), -1)
+    for net in range (len (ionn)):
+        positions [net, ionn [net] - 1] = np.arange (len (ionn [net]))
+    return positions
+
+def _native (array):
+    """
+    Return array in native byte order, copying only if array is a big-endian view into a dump file (lists are returned as is)
+    """
+    if not isinstance (array, np.ndarray) or array.dtype.isnative:
+        return array
+    return array.astype (array.dtype.newbyteorder ('='))
+
 class Isotope(object):
     """
     A python representation of an isotope
+    
+    Isotopes are interned: constructing an isotope that has been constructed before returns the existing object, so each distinct isotope is parsed once per process
     """
-    def __init__(self, string, a = None, z = None, **kwargs):
-        super (Isotope, self).__init__()
-
+    __slots__ = ('string', 'a', 'z', 'key', 'data', '_label')
+    
+    # The interned isotopes, keyed both by the arguments they were constructed with and by their normalized string, mass number, and charge
+    registry = {}
+    
+    def __new__ (cls, string, a = None, z = None, **kwargs):
+        try:
+            string = string.decode ()
+        except AttributeError:
+            pass
+        
+        # Isotopes carrying their own data are not shared
+        if not kwargs:
+            try:
+                return cls.registry [(string, a, z)]
+            except KeyError:
+                pass
+        
+        self = super (Isotope, cls).__new__ (cls)
+        self._parse (string, a, z)
+        self.data = dict (kwargs)
+        if kwargs:
+            return self
+        
+        self = cls.registry.setdefault ((self.string, self.a, self.z), self)
+        cls.registry [(string, a, z)] = self
+        return self
+        
+    def __init__ (self, string, a = None, z = None, **kwargs):
+        # Everything is set up in __new__, since an interned isotope is only initialized once
+        pass
+        
+    def __getnewargs__ (self):
+        return (self.string, self.a, self.z)
+        
+    def _parse (self, string, a, z):
+        """
+        Set the string, mass number, charge, and sorting key of the isotope from its name and, if given, a and z
+        """
         if string == "neutrons":
             string = "nt1"
         
-        try:
-            self.string = string.decode ()
-        except AttributeError:
-            self.string = string
+        self.string = string
         
         reverse = False
         if self.string [0].isdigit ():
@@ -74,27 +129,34 @@ class Isotope(object):
         else:
             self.string = string
             
-        self.data = {}
-        self.label = self.makeLabel (self.string, self.a)
-        for key in kwargs:
-            self.data [key] = kwargs [key]
+        # Pack the charge and mass number into one integer for fast sorting, comparison, and hashing
+        self.key = (int (round (self.z)) << 10) | int (round (self.a))
+        self._label = None
+        
+    @property
+    def label (self):
+        if self._label is None:
+            self._label = self.makeLabel (self.string, self.a)
+        return self._label
             
     def __lt__ (self, other):
-        if self.z < other.z:
-            return True
-        if self.z == other.z and self.a < other.a:
-            return True
-        return False
+        return self.key < other.key
         
     def __gt__ (self, other):
-        if self.z > other.z:
-            return True
-        if self.z == other.z and self.a > other.a:
-            return True
-        return False
+        return self.key > other.key
         
     def __eq__ (self, other):
-        return self.z == other.z and self.a == other.a
+        if not isinstance (other, Isotope):
+            return NotImplemented
+        return self.key == other.key
+        
+    def __ne__ (self, other):
+        if not isinstance (other, Isotope):
+            return NotImplemented
+        return self.key != other.key
+        
+    def __hash__ (self):
+        return self.key
             
     def __str__ (self):
         return self.string
@@ -149,14 +211,262 @@ class Isotope(object):
     def fromList (cls, isotopes):
         return [cls (iso) for iso in isotopes]
 
-class Dump (object):
+class ParameterDict (collections.abc.MutableMapping):
+    """
+    A dictionary of dump parameters that stores the plain values and only attaches astropy units to a parameter when it is accessed
+    """
+    def __init__ (self):
+        self.plain = {}
+        self.units = {}
+        
+    def __getitem__ (self, name):
+        value = self.plain [name]
+        if isinstance (value, u.Quantity):
+            return value
+        return u.Quantity (value, self.units.get (name, u.dimensionless_unscaled), dtype = type (value))
+        
+    def __setitem__ (self, name, value):
+        self.plain [name] = value
+        
+    def __delitem__ (self, name):
+        del self.plain [name]
+        
+    def __iter__ (self):
+        return iter (self.plain)
+        
+    def __len__ (self):
+        return len (self.plain)
+        
+    def getValue (self, name):
+        """
+        Return the value of the parameter name without units
+        """
+        value = self.plain [name]
+        if isinstance (value, u.Quantity):
+            return value.value
+        return value
+
+class AbundanceColumns (object):
+    """
+    The base class of the zone by isotope abundance matrices, which finds the column of each ion by its name
+    """
+    def _setNames (self, names):
+        """
+        Set the ion names of the columns and index the columns by name; like the data frame, a repeated name refers to the last ion with that name
+        """
+        self.names = list (names)
+        self.positions = {name: i for i, name in enumerate (self.names)}
+        
+    def __contains__ (self, name):
+        return name in self.positions
+        
+    def index (self, name):
+        """
+        Return the column of the ion name
+        """
+        return self.positions [name]
+        
+    def indices (self, names):
+        """
+        Return an array of the columns of the ion names
+        """
+        return np.array ([self.positions [name] for name in names], dtype = int)
+
+class AbundanceArray (AbundanceColumns):
+    """
+    A dense zone by isotope matrix of mass fractions, stored by isotope so that each isotope's column is contiguous
+    """
+    def __init__ (self, data, names):
+        """
+        Wrap data, a (zones, isotopes) array, whose columns are the abundances of the ions in names
+        """
+        self.data = data
+        self._setNames (names)
+        self.shape = data.shape
+        
+    def column (self, name):
+        """
+        Return the mass fraction of the ion name in each zone, as a view into the matrix
+        """
+        return self.data [:, self.index (name)]
+        
+    def integrate (self, name, weights):
+        """
+        Return the sum over the zones of the mass fraction of the ion name times weights, e.g. the zone masses for the total mass of the ion
+        """
+        return np.dot (weights, self.column (name))
+        
+    def integrateAll (self, weights):
+        """
+        Return the sum over the zones of the mass fraction times weights for every isotope at once
+        """
+        return np.dot (weights, self.data)
+        
+    def weightedSum (self, weights):
+        """
+        Return the sum over the isotopes in each zone of the mass fraction times weights, which has one element per isotope
+        """
+        return np.dot (self.data, weights)
+        
+    def max (self):
+        """
+        Return the largest mass fraction in each zone
+        """
+        return self.data.max (1)
+        
+    @property
+    def nbytes (self):
+        return self.data.nbytes
+
+class AbundanceMatrix (AbundanceColumns):
+    """
+    A sparse zone by isotope matrix of mass fractions, stored by isotope in compressed sparse column form
+    Only the nonzero abundances of the isotopes in each zone's network are kept, so that large burn networks take a fraction of the memory of a dense matrix
+    """
+    def __init__ (self, ppn, ionn, netnum, aion, names):
+        """
+        Build the matrix from ppn, the (zones, network ions) abundance data; ionn, the numbers (starting from 1) of the ions in each network; netnum, the network of each zone (starting from 1); aion, the mass numbers of the ions; and names, the ion names
+        """
+        self._setNames (names)
+        self.shape = (len (ppn), len (self.names))
+        
+        zones = []
+        isotopes = []
+        values = []
+        netnum = np.asarray (netnum)
+        columns = np.arange (self.shape [1])
+        for net in np.unique (netnum):
+            rows = np.flatnonzero (netnum == net)
+            # Where a network lists an ion twice, only its last entry counts, as it does in a dense scatter
+            ions = columns [ionn [net - 1] - 1]
+            last = len (ions) - 1 - np.unique (ions [::-1], return_index = True) [1]
+            block = ppn [rows] [:, last] * aion [ions [last]]
+            nonzero = np.nonzero (block)
+            zones.append (rows [nonzero [0]])
+            isotopes.append (ions [last] [nonzero [1]])
+            values.append (block [nonzero])
+        
+        zones = np.concatenate (zones) if zones else np.zeros (0, dtype = int)
+        isotopes = np.concatenate (isotopes) if isotopes else np.zeros (0, dtype = int)
+        values = np.concatenate (values) if values else np.zeros (0)
+        
+        # Sort the entries by isotope, then by zone
+        order = np.lexsort ((zones, isotopes))
+        self.zones = zones [order].astype (np.int32)
+        self.values = values [order].astype (float)
+        self.indptr = np.concatenate (([0], np.cumsum (np.bincount (isotopes, minlength = self.shape [1]))))
+        
+    @classmethod
+    def fromArrays (cls, names, shape, zones, values, indptr):
+        """
+        Rebuild a matrix from its stored arrays, as written by DumpCache
+        """
+        matrix = cls.__new__ (cls)
+        matrix._setNames (names)
+        matrix.shape = tuple (shape)
+        matrix.zones = zones
+        matrix.values = values
+        matrix.indptr = indptr
+        return matrix
+    
+    def _isotopes (self):
+        """
+        Return the column of each stored entry
+        """
+        return np.repeat (np.arange (self.shape [1]), np.diff (self.indptr))
+        
+    def _slice (self, name):
+        i = self.index (name)
+        return slice (self.indptr [i], self.indptr [i + 1])
+        
+    def column (self, name):
+        """
+        Return the dense array of the mass fraction of the ion name in each zone
+        """
+        entries = self._slice (name)
+        column = np.zeros (self.shape [0])
+        column [self.zones [entries]] = self.values [entries]
+        return column
+        
+    def integrate (self, name, weights):
+        """
+        Return the sum over the zones of the mass fraction of the ion name times weights, e.g. the zone masses for the total mass of the ion
+        """
+        entries = self._slice (name)
+        return np.sum (self.values [entries] * weights [self.zones [entries]])
+        
+    def integrateAll (self, weights):
+        """
+        Return the sum over the zones of the mass fraction times weights for every isotope at once
+        """
+        return np.bincount (self._isotopes (), self.values * weights [self.zones], minlength = self.shape [1])
+        
+    def weightedSum (self, weights):
+        """
+        Return the sum over the isotopes in each zone of the mass fraction times weights, which has one element per isotope
+        """
+        return np.bincount (self.zones, self.values * weights [self._isotopes ()], minlength = self.shape [0])
+        
+    def max (self):
+        """
+        Return the largest mass fraction in each zone
+        """
+        maximum = np.zeros (self.shape [0])
+        np.maximum.at (maximum, self.zones, self.values)
+        return maximum
+        
+    def coreIndices (self, columns = None):
+        """
+        Return the index of the outermost zone at which each of columns (by default, every column) stops being the most abundant species, or the last zone if there is none, as DataDump._coreIndices does for a dense matrix
+        The zone maxima are found once, and only the columns that are the most abundant somewhere are looked at zone by zone
+        """
+        if columns is None:
+            columns = np.arange (self.shape [1])
+        columns = np.asarray (columns, dtype = int)
+        n = self.shape [0]
+        maximum = self.max ()
+        top = self.values >= maximum [self.zones]
+        # In zones with no abundances, every isotope without a stored entry is as abundant as any other
+        empty = np.flatnonzero (maximum <= 0)
+        
+        # Count the entries of each column that are the most abundant in their zone
+        counts = np.concatenate (([0], np.cumsum (top)))
+        counts = counts [self.indptr [1:]] - counts [self.indptr [:-1]]
+        
+        indices = np.full (len (columns), n - 1)
+        for k in np.flatnonzero ((counts [columns] > 0) | (len (empty) > 0)):
+            entries = slice (self.indptr [columns [k]], self.indptr [columns [k] + 1])
+            zones = self.zones [entries]
+            # The zones in which the column is not below the maximum
+            above = zones [top [entries]]
+            if len (empty) > 0:
+                above = np.union1d (above, np.setdiff1d (empty, zones))
+            if len (above) == 0 or len (above) == n:
+                continue
+            if above [-1] < n - 1:
+                indices [k] = above [-1] + 1
+            else:
+                # The column is the most abundant out to the surface, so the core starts where that last run of zones does
+                runs = above - np.arange (len (above))
+                indices [k] = above [np.argmax (runs == runs [-1])]
+        return indices
+        
+    @property
+    def nbytes (self):
+        return self.zones.nbytes + self.values.nbytes + self.indptr.nbytes
+
+class Dump (OutputFile):
     """
     This base class contains most of the dump file information except the actual data
+    
+    The file is read with the readers of OutputFile. If memmap, the file is mapped into memory once and arrays are read as big-endian views into the mapping rather than copied out of it
     """
-    def __init__(self, fileName):
-        super(Dump, self).__init__()
-        self.parameters = {}
-        self.file = fortranfile.FortranFile (fileName)
+    def __init__(self, fileName, memmap = False):
+        super(Dump, self).__init__(fileName, memmap)
+        self.parameters = ParameterDict ()
+        self.index = {}
+        self.fileName = fileName
+        self._open ()
         
         self.state = fileName.split ('#') [-1]
         print ("Loading Dump from " + fileName)
@@ -164,7 +474,82 @@ class Dump (object):
         # Read dump file contents
         self._read ()
         
-        self.file.close ()
+        self._close ()
+        
+    # The readers of OutputFile, under the names used throughout this module
+    _readArray = OutputFile._read_array
+    _readInt = OutputFile._read_int
+    _readInts = OutputFile._read_ints
+    _readDouble = OutputFile._read_double
+    _readDoubles = OutputFile._read_doubles
+    _readChars = OutputFile._read_chars
+    _readStrings = OutputFile._read_strings
+    
+    def _index (self, name, offset, dtype, shape, strides = None, start = None):
+        """
+        Record the byte offset, type and shape of the named array in self.index so that it can later be read without reading the rest of the file
+        strides defaults to a contiguous array; start is only given for zone arrays and is the zone at which the array begins (it is nonzero if the array is shorter than the zone arrays)
+        """
+        dtype = np.dtype (dtype)
+        if strides is None:
+            strides = [int (np.prod (shape [i + 1:])) * dtype.itemsize for i in range (len (shape))]
+        self.index [name] = {'offset': offset, 'dtype': dtype.str, 'shape': list (shape), 'strides': list (strides), 'start': start}
+        
+    def _indexKey (self):
+        """
+        Return the values that identify this version of the dump file; an index is only valid for a file with the same key
+        """
+        uuiddump = getattr (self, 'uuiddump', None)
+        return {'size': os.path.getsize (self.fileName), 'mtime': os.path.getmtime (self.fileName), 'uuiddump': uuiddump.hex () if uuiddump is not None else None}
+        
+    def _readIndexFile (self):
+        """
+        Return the arrays recorded in the .kidx index file of the dump, or None if there is no index file or it is out of date
+        """
+        try:
+            with open (self._index_file_name (), 'r') as file:
+                saved = json.load (file)
+        except (IOError, ValueError):
+            return None
+        if saved.get ('key') != self._indexKey ():
+            return None
+        return saved ['arrays']
+        
+    def loadIndex (self):
+        """
+        Load the byte offsets of the named arrays from the .kidx index file of the dump; return whether a valid index file was found
+        """
+        arrays = self._readIndexFile ()
+        if arrays is None:
+            return False
+        self.index = arrays
+        return True
+        
+    def saveIndex (self):
+        """
+        Write the byte offsets of the named arrays to the .kidx index file of the dump
+        """
+        with open (self._index_file_name (), 'w') as file:
+            json.dump ({'key': self._indexKey (), 'arrays': self.index}, file)
+        
+    def readArray (self, name):
+        """
+        Read the named array straight from its offset in self.index without reading any other part of the file
+        Return a np array with the byte order of the file
+        """
+        entry = self.index [name]
+        dtype = np.dtype (entry ['dtype'])
+        shape = tuple (entry ['shape'])
+        strides = tuple (entry ['strides'])
+        if self.buffer is not None:
+            return np.ndarray (shape, dtype, buffer = self.buffer, offset = entry ['offset'], strides = strides)
+        
+        # Read only the bytes spanned by the array
+        span = dtype.itemsize + sum ((n - 1) * stride for n, stride in zip (shape, strides)) if all (shape) else 0
+        with self:
+            self.file.seek (entry ['offset'])
+            data = self._read_bytes (span)
+        return np.ndarray (shape, dtype, buffer = data, strides = strides)
         
     def getRunId (self):
         """
@@ -184,73 +569,27 @@ class Dump (object):
         """
         return self.state
         
-    def _readInt (self, kind = 8):
-        """
-        Read a single integer from self.file, kind is the fortran kind of integer to read (2, 4, 8 possible)
-        """
-        if kind == 16:
-            return struct.unpack ('>' + str (1) + 'q', self.file.read (8)) [0]
-        if kind == 8:
-            return struct.unpack ('>' + str (1) + 'i', self.file.read (4)) [0]
-        if kind == 4:
-            return struct.unpack ('>' + str (1) + 'h', self.file.read (2)) [0]
-        if kind == 2:
-            return struct.unpack ('>' + str (1) + 'b', self.file.read (1)) [0]
-        raise TypeError ("Unrecognized integer kind.")
-
-    def _readInts (self, num, kind = 8):
-        """
-        Read num integers from self.file, kind is the fortran kind of integer to read (2, 4, 8 possible)
-        Return a np array of integers
-        """
-        if kind == 16:
-            return np.array (struct.unpack ('>' + str (num) + 'q', self.file.read (num * 8)))
-        if kind == 8:
-            return np.array (struct.unpack ('>' + str (num) + 'i', self.file.read (num * 4)))
-        if kind == 4:
-            return np.array (struct.unpack ('>' + str (num) + 'h', self.file.read (num * 2)))
-        if kind == 2:
-            return np.array (struct.unpack ('>' + str (num) + 'b', self.file.read (num)))
-        else:
-            raise TypeError ("Unrecognized integer kind.")
-
-    def _readDouble (self, kind = 8):
-        """
-        Read a single double from self.file, kind is the fortran kind of real to read (8 possible)
-        """
-        if kind == 8:
-            return struct.unpack ('>' + str (1) + 'd', self.file.read (8)) [0]
-        if kind == 4:
-            return struct.unpack ('>' + str (1) + 'f', self.file.read (4)) [0]
-
-    def _readDoubles (self, num, kind = 8):
+    def _locateSections (self):
         """
-        Read num doubles from self.file, kind is the fortran kind of real to read (8 possible)
-        Return a np array of doubles
+        Compute the byte offset of each section of the dump file from the header counts and parameters, so that sections can be seeked to without reading what comes before them
         """
-        return np.array (struct.unpack ('>' + str (num) + 'd', self.file.read (num * kind)))
-
-    def _readChars (self, num, asByteString = False):
-        """
-        Read num characters from self.file; if asByteString, return a byte string, else return a python string
-        """
-        chars = self.file.read (num)
-        if asByteString:
-            return chars
-        chars = re.sub(r'[^ -~]', '', chars.decode ('utf-8'))
-        return chars.rstrip ()
+        self.sections = {}
+        self.sections ['header'] = 8
+        self.sections ['parameters'] = (self.iratioz * self.lenHeader + 5) * 4
+        self.sections ['qparameters'] = self.sections ['parameters'] + (self.numParameters + 2) * 8
+        self.sections ['smallArrays'] = self.sections ['qparameters'] + (self.numDerivedParameters + 2) * 8
+        self.sections ['smallCharArrays'] = self.sections ['smallArrays'] + (self.lenSmallArrays + 1) * 8
+        self.sections ['zones'] = self.sections ['smallCharArrays'] + self.lenSmallCharArrays * 8
+        self.sections ['ppn'] = self.sections ['zones'] + (self.jmsave + 2) * min (self.numCenteredZoneArrays + self.numInterfacialZoneArrays, 33) * 8
+        self.sections ['viscosity'] = self.sections ['ppn'] + (self.numNetworkIons * (self.jmsave - 1) + 1) * 8
+        
+        # Magnetic fields, if present, sit between the ppn data and the viscosity arrays
+        if (self.parameters ['magnet'] > 0.0):
+            self.sections ['magnet'] = self.sections ['viscosity']
+            self.sections ['viscosity'] += 3 * ((self.jmsave + 1) * 2 * 8 + 8)
         
-    def _readStrings (self, num, charsPer, asByteString = False):
-        """
-        Read num strings from self.file, if asByteString, return a list of byte strings, else return a list of python strings
-        """
-        return [self._readChars (charsPer, asByteString) for i in range (num)]
-        
-    def _skip (self, num):
-        """
-        Skip num bytes in self.file
-        """
-        self.file.read (num)
+        # The viscosity and diffusion arrays are followed by the convective energy array
+        self.sections ['uuid'] = self.sections ['viscosity'] + (self.jmsave + 2) * 2 * 8 + (self.jmsave - 1) * 8
         
     def _read (self):
         """
@@ -259,6 +598,7 @@ class Dump (object):
             -Parameters
             -Qparameters
             -UUID Information
+        Everything else is seeked past, so only a few KB of the file are read
         """
         
         # Read off the first few bytes
@@ -279,23 +619,13 @@ class Dump (object):
         if self.version < 170011:
             self.parameters ['iold'] += 8
         
-        #Skip the small arrays
-        self._skip ((self.lenSmallArrays + 1) * 8)
-
-        # Read the program name
-        self.namep = self._readChars (8)
+        self._locateSections ()
+        if self.sections ['uuid'] > self._size ():
+            raise TypeError ("Dump file %s is truncated" % self.fileName)
         
-        # Skip the small character arrays, zones and ppn
-        self._skip ((self.lenSmallCharArrays - 1 + (self.jmsave + 1 + 1) * min (self.numCenteredZoneArrays + self.numInterfacialZoneArrays, 33) + self.numNetworkIons * (self.jmsave - 1) + 1) * 8)
-        
-        # Magnetic fields should be included here
-        if (self.parameters ['magnet'] > 0.0):
-            self._skip ((self.jmsave + 1) * 2 * 8 + 8)
-            self._skip ((self.jmsave + 1) * 2 * 8 + 8)
-            self._skip ((self.jmsave + 1) * 2 * 8 + 8)
-        
-        # Skip viscosity and diffusion arrays
-        self._skip ((self.jmsave + 2) * 2 * 8)
+        # Seek past the small arrays and read the program name
+        self.file.seek (self.sections ['smallCharArrays'])
+        self.namep = self._readChars (8)
         
         # TODO Include flame data reader
         assert (self.parameters ['sharp1'] <= 0.0)
@@ -303,8 +633,8 @@ class Dump (object):
         # TODO Include WIMP data reader
         assert (self.parameters ['wimp'] <= 0.0)
         
-        # Skip viscosity and diffusion arrays
-        self._skip ((self.jmsave - 1) * 8)
+        # Seek past the small character arrays, zones, ppn, magnetic fields, and viscosity and diffusion arrays
+        self.file.seek (self.sections ['uuid'])
         
         # Read in UUIDs
         if self.version >= 170004:
@@ -319,23 +649,36 @@ class Dump (object):
         Read in the header of the dump file and set the appropriate variables
         """
         self.ncyc = self._readInt ()
-        self.lenHeader, self.maxZones, self.maxBurnZones, self.nburn, self.iratioz, self.nvar = self._readInts (6)
-        self.nheadz, self.nhead, self.numParameters, self.nparm, self.numDerivedParameters, self.nqparm = self._readInts (6)
-        self.numNetworks, self.maxNetworkIons, self.numTotalIons, self.numNetworksb, self.maxNetworkIonsb, self.numTotalIonsb = self._readInts (6)
-        self.nreacz, self.maxTimestepControllers, self.ndt, self.maxPistons, self.maxYeInitializations, self.nsubz, self.nsub = self._readInts (7)
-        self.numInterfacialZoneArrays, self.numCenteredZoneArrays, self.nzoneb, self.lenSmallArrays, self.lenSmallCharArrays = self._readInts (5)
-        self.numNetworkIons, self.numBurnIons, self.nreac, self.jmsave, self.lencom, self.lencomc = self._readInts (6)
-        self.nedtcom, self.ndatqz, self.ngridz, self.nylibz, self.nyoffst = self._readInts (5)
-        self.lenshed, self.lenqhed, self.nzedz, self.ncsavdz = self._readInts (4)
+        self.lenHeader, self.maxZones, self.maxBurnZones, self.nburn, self.iratioz, self.nvar = self._readInts (6).tolist ()
+        self.nheadz, self.nhead, self.numParameters, self.nparm, self.numDerivedParameters, self.nqparm = self._readInts (6).tolist ()
+        self.numNetworks, self.maxNetworkIons, self.numTotalIons, self.numNetworksb, self.maxNetworkIonsb, self.numTotalIonsb = self._readInts (6).tolist ()
+        self.nreacz, self.maxTimestepControllers, self.ndt, self.maxPistons, self.maxYeInitializations, self.nsubz, self.nsub = self._readInts (7).tolist ()
+        self.numInterfacialZoneArrays, self.numCenteredZoneArrays, self.nzoneb, self.lenSmallArrays, self.lenSmallCharArrays = self._readInts (5).tolist ()
+        self.numNetworkIons, self.numBurnIons, self.nreac, self.jmsave, self.lencom, self.lencomc = self._readInts (6).tolist ()
+        self.nedtcom, self.ndatqz, self.ngridz, self.nylibz, self.nyoffst = self._readInts (5).tolist ()
+        self.lenshed, self.lenqhed, self.nzedz, self.ncsavdz = self._readInts (4).tolist ()
         things = self._readInts (self.iratioz * self.lenHeader - 47)
         self._readDouble ()
         self._readDouble ()
             
-    def _readParameters (self, dic, numParameters, tableFile, comment = '#', unitCol = 4, defaultCol = 3):
+    # The compiled parameter layouts, keyed by table file, KEPLER version, and number of parameters
+    parameterLayouts = {}
+    
+    @classmethod
+    def _compileParameters (cls, version, numParameters, tableFile, comment = '#', unitCol = 4, defaultCol = 3):
         """
-        Read in the parameters from self.file using tableFile as a guide; comment is the comment character for tableFile, unitCol is the column of the unit string in tableFile
-        Puts parameters in dic as astropy Quantity objects, complete with units
+        Compile tableFile into the layout of the numParameters parameters written by the given KEPLER version, caching it so that each table is only parsed once per version
+        Return a numpy structured type for the parameter block, a dictionary of units, and a dictionary of the default values of any parameters missing from the block
         """
+        key = (tableFile, version, numParameters, unitCol, defaultCol)
+        if key in cls.parameterLayouts:
+            return cls.parameterLayouts [key]
+        
+        names = []
+        formats = []
+        units = {}
+        defaults = {}
+        
         # Open the parameter file
         file = open (tableFile, 'r')
         i = 0
@@ -344,7 +687,7 @@ class Dump (object):
             if len (words) == 0 or words [0] == comment:
                 # Check that this isn't a comment line
                 continue
-            elif len (words) > 6 and words [6] != '\n' and words [6] != '' and int (words [6].rstrip ('\n')) > self.version:
+            elif len (words) > 6 and words [6] != '\n' and words [6] != '' and int (words [6].rstrip ('\n')) > version:
                 # Check that this parameter wasn't added after the current version
                 print ("Skipping parameter " + words [1] + " because this version of KEPLER predates it")
                 continue
@@ -356,72 +699,424 @@ class Dump (object):
                     print ("WARNING: DEFAULTING for " + words [1])
                     if defaultCol != None:
                         if words [2] == 'float':
-                            dic [words [1]] = float (words [3])
+                            defaults [words [1]] = float (words [3])
                         elif words [2] == 'integer':
-                            dic [words [1]] = int (words [3])
+                            defaults [words [1]] = int (words [3])
                     else:
                         continue
                 else:
-                    #Check the type of the parameter and read it in
+                    #Check the type of the parameter; integers only fill the first half of their 8 byte chunk
                     if words [2] == 'float':
-                        dic [words [1]] = self._readDouble ()
-                    
+                        formats.append (realKinds [8])
                     elif words [2] == 'integer':
-                        dic [words [1]] = self._readInt ()
-                    
-                        #If it's an integer, read off the remainder of the 8 byte chunk
-                        self._readInt ()
-                    
+                        formats.append (intKinds [8])
                     else:
                         # Unrecognized type, raise an error
                         raise TypeError (words [2])
+                    names.append (words [1])
             # Read in units
             if words [unitCol] != '-':
-                dic [words [1]] = u.Quantity (dic [words [1]], words [unitCol], dtype = type (dic [words [1]]))
+                units [words [1]] = u.Unit (words [unitCol])
             else:
-                dic [words [1]] = u.Quantity (dic [words [1]], "1", dtype = type (dic [words [1]]))
+                units [words [1]] = u.dimensionless_unscaled
+        file.close ()
                 
-        # Check that we've read all the parameters in the dump file; if there are extras, give them names of 'parm###', type double, and no units
+        # If there are more parameters in the dump file than in the table, give them names of 'parm###', type double, and no units
         for j in range (i + 1, numParameters + 1):
-            dic ['parm' + str (j)] = u.Quantity (self._readDouble (), '1', dtype = float)
+            names.append ('parm' + str (j))
+            formats.append (realKinds [8])
+            units ['parm' + str (j)] = u.dimensionless_unscaled
+            
+        # Each parameter takes 8 bytes, and the block ends with the remainder of the chunk
+        layout = np.dtype ({'names': names, 'formats': formats, 'offsets': [8 * k for k in range (len (names))], 'itemsize': 8 * numParameters + 16})
+        cls.parameterLayouts [key] = (layout, units, defaults)
+        return cls.parameterLayouts [key]
             
-        # Read off the remainder of the chunk
-        self._readDoubles (2)
+    def _readParameters (self, dic, numParameters, tableFile, comment = '#', unitCol = 4, defaultCol = 3):
+        """
+        Read in the parameters from self.file using tableFile as a guide; comment is the comment character for tableFile, unitCol is the column of the unit string in tableFile
+        Puts parameters in dic, a ParameterDict, which gives them as astropy Quantity objects, complete with units
+        """
+        layout, units, defaults = self._compileParameters (self.version, numParameters, tableFile, comment, unitCol, defaultCol)
+        
+        # Read the whole parameter block at once
+        record = self._readArray (1, layout) [0]
+        dic.plain.update (defaults)
+        dic.plain.update (zip (layout.names, record.tolist ()))
+        dic.units.update (units)
+
+class DumpCache (object):
+    """
+    An on-disk cache of decoded dumps, so that a dump is only decoded from KEPLER's format once
+    
+    Each entry is a directory named by the uuiddump of the dump (and whether the burn network or sparse abundances were loaded) holding the data frame columns and abundances as native-endian .npy arrays, read back as memory maps, and a JSON file of the isotopes, array index, and the key of the dump file; an entry is only used for a dump file with the same key (size, modification time, and uuiddump)
+    
+    If maxBytes is given, the least recently used entries are removed whenever the cache grows beyond it; loading an entry marks it as used
+    
+    Entries written with a different version of the cache format are not used
+    """
+    
+    # The version of the format of the entries, to be raised whenever what is written changes
+    version = 1
+    
+    def __init__ (self, directory, maxBytes = None):
+        self.directory = directory
+        self.maxBytes = maxBytes
+    
+    @classmethod
+    def fromEnvironment (cls):
+        """
+        Return the cache in the directory named by the KEPLER_DUMP_CACHE environment variable, with the byte limit in KEPLER_DUMP_CACHE_SIZE, or None if it is not set
+        """
+        directory = os.environ.get ('KEPLER_DUMP_CACHE')
+        if not directory:
+            return None
+        maxBytes = os.environ.get ('KEPLER_DUMP_CACHE_SIZE')
+        return cls (directory, int (maxBytes) if maxBytes else None)
+    
+    def _path (self, dump):
+        """
+        Return the directory of the entry of dump, or None if the dump has no uuid to name it by
+        """
+        if getattr (dump, 'uuiddump', None) is None:
+            return None
+        return os.path.join (self.directory, dump.uuiddump.hex () + ('-burn' if dump.loadBurn else '') + ('-sparse' if dump.sparse else ''))
+    
+    def load (self, dump):
+        """
+        Fill in the data frame, abundances, and isotopes of dump from its entry; return whether an up-to-date entry was found
+        """
+        path = self._path (dump)
+        if path is None:
+            return False
+        try:
+            with open (os.path.join (path, 'entry.json'), 'r') as file:
+                entry = json.load (file)
+        except (IOError, ValueError):
+            return False
+        if entry.get ('version') != self.version or entry ['key'] != dump._indexKey ():
+            return False
+        
+        load = lambda name: np.load (os.path.join (path, name + '.npy'), mmap_mode = 'r')
+        dump.index = entry ['index']
+        dump.ionNames = entry ['ionNames']
+        dump.ions = [Isotope (name, a, z) for name, a, z in entry ['ions']]
+        if entry ['sparse']:
+            dump.abundances = AbundanceMatrix.fromArrays (dump.ionNames, entry ['shape'], load ('zones'), load ('values'), load ('indptr'))
+        else:
+            dump.abundances = AbundanceArray (load ('abundances'), dump.ionNames)
+        
+        # The abundance columns of the data frame are views into the abundances rather than stored twice
+        columns = collections.OrderedDict ()
+        for i, name in enumerate (entry ['columns']):
+            columns [name] = dump.abundances.column (name) if name in entry ['abundanceColumns'] else load ('column%i' % i)
+        dump.df = pandas.DataFrame (columns, copy = False)
+        
+        # Mark the entry as recently used
+        os.utime (path, None)
+        return True
+    
+    def save (self, dump):
+        """
+        Write an entry for dump, which must have been fully read, then remove the least recently used entries if the cache is over its size limit
+        """
+        path = self._path (dump)
+        if path is None:
+            return
+        
+        # Write the entry to a temporary directory and move it into place, so that other processes never see part of an entry
+        os.makedirs (self.directory, exist_ok = True)
+        temporary = tempfile.mkdtemp (dir = self.directory, prefix = '.tmp')
+        # mkdtemp makes the directory private; give the entry the permissions of a directory made with the process's umask, so that the cache can be shared
+        umask = os.umask (0)
+        os.umask (umask)
+        os.chmod (temporary, 0o777 & ~umask)
+        save = lambda name, array: np.save (os.path.join (temporary, name + '.npy'), array)
+        sparse = isinstance (dump.abundances, AbundanceMatrix)
+        if sparse:
+            save ('zones', dump.abundances.zones)
+            save ('values', dump.abundances.values)
+            save ('indptr', dump.abundances.indptr)
+        else:
+            save ('abundances', np.asfortranarray (dump.abundances.data))
+        
+        abundanceColumns = []
+        for i, name in enumerate (dump.df.columns):
+            if not sparse and name in dump.abundances:
+                abundanceColumns.append (name)
+                continue
+            values = _native (dump.df [name].to_numpy ())
+            save ('column%i' % i, values.astype (str) if values.dtype == object else values)
+        
+        with open (os.path.join (temporary, 'entry.json'), 'w') as file:
+            json.dump ({'version': self.version, 'key': dump._indexKey (), 'index': dump.index, 'columns': list (dump.df.columns), 'abundanceColumns': abundanceColumns, 'sparse': sparse, 'shape': list (dump.abundances.shape),
+                'ionNames': dump.ionNames, 'ions': [[ion.string, float (ion.a), float (ion.z)] for ion in dump.ions]}, file)
+        
+        if os.path.exists (path):
+            shutil.rmtree (path, ignore_errors = True)
+        try:
+            os.rename (temporary, path)
+        except OSError:
+            # Another process has just written the same entry
+            shutil.rmtree (temporary, ignore_errors = True)
+        self.evict ()
+    
+    def _entries (self):
+        """
+        Return the paths, last use times, and sizes in bytes of the entries of the cache
+        """
+        entries = []
+        if not os.path.isdir (self.directory):
+            return entries
+        for name in os.listdir (self.directory):
+            path = os.path.join (self.directory, name)
+            if name.startswith ('.') or not os.path.isdir (path):
+                continue
+            size = sum (os.path.getsize (os.path.join (path, file)) for file in os.listdir (path))
+            entries.append ((path, os.path.getmtime (path), size))
+        return entries
+    
+    def evict (self):
+        """
+        Remove the least recently used entries until the cache is within its size limit
+        """
+        if self.maxBytes is None:
+            return
+        entries = sorted (self._entries (), key = lambda entry: entry [1])
+        total = sum (entry [2] for entry in entries)
+        for path, used, size in entries:
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree (path, ignore_errors = True)
+            total -= size
 
 class DataDump (Dump):
     """
     This class takes KEPLER dump file as its argument and produces an indexable object containing the star data
+    
+    If memmap, the zone arrays are kept as big-endian views into the memory-mapped file, and so are the columns of the data frame built from them; each column is only converted to native byte order when it is first accessed
+    
+    If useIndex, the byte offsets of the zone and abundance arrays found while reading are written to a hidden .kidx index file next to the dump (unless an up-to-date one already covers them), from which Dump.readArray can later read single arrays
+    
+    If lazy, no data frame is built; each column is decoded from the file on first access and memoized. With an up-to-date index file (and useIndex), the file is not read at all until a column is accessed
+    
+    If sparse, the abundances are kept out of the data frame in an AbundanceMatrix, self.abundances, which stores only the nonzero mass fractions of each zone's network; they are still accessed as dump ["fe56"] (sparse has no effect if lazy)
+    
+    If cache is a DumpCache (or the directory of one), the decoded data frame and abundances are loaded from it when it holds this dump, and written to it after the dump is decoded otherwise; by default, the cache named by the KEPLER_DUMP_CACHE environment variable is used, if any, and cache = False disables it. A dump loaded from the cache has no data, stardata, or units dictionaries of the raw arrays (nor is a lazy dump cached)
     """
-    def __init__(self, fileName, loadBurn = False):
-        super(DataDump, self).__init__ (fileName)
+    # Names, units, and types of the interfacial, centered, and burn zone arrays, in the order they appear in the dump file
+    zoneiNames = ['ym', 'rn', 'rd', 'un', 'xln', 'qln', 'qld', 'difi', 'vconvect', 'oslen', 'adindex']
+    zoneiUnits = [u.g, u.cm, u.cm, u.cm / u.s, u.erg / u.s, u.erg / u.s, u.erg / u.s, u.cm ** 2 / u.s]
+    zonecNames = ['netnum', 'xm', 'dn', 'tn', 'td', 'en', 'pn', 'zn', 'etan', 'sn', 'snn', 'abar', 'zbar', 'xkn', 'xnei', 'stot', 'angj','angdg', 'angddsi', 'angdshi', 'angdssi', 'angdez', 'angdgsf', 'dsold', 'tsold', 'snold', 'snbd', 'snbt', 'abarold', 'abarnbd', 'abarnbt', 'ypbtime', 'ynbtime']
+    zonecUnits = [1, u.g, u.g / u.cm ** 3, u.K, u.K, u.erg / u.g, u.erg / u.cm ** 3, u.erg, 1, u.erg / u.g / u.s, u.erg / u.g / u.s, u.g / u.mol, 1, u.cm ** 2 / u.g, 1.0 / u.cm ** 3, u.k, u.g / u.cm ** 3, u.K, u.erg / u.g / u.s, u.erg * u.cm ** 3 / u.s / u.g ** 2, u.erg / u.g / u.s / u.K, 1, u.cm ** 3 / u.g, 1.0 / u.K, u.mol / u.g / u.s, u.mol / u.g / u.s]
+    zonecIsint = [True] + [False] * (len (zonecNames) - 1)
+    zonebNames = ['netnumb', 'zlimab', 'zlimzb', 'zlimcb', 'timen', 'dtimen', 'dnold', 'tnold', 'ymb', 'sburn', 'etab', 'pbuf']
+    zonebUnits = [1, 1, 1, 1, u.s, u.s, u.g / u.cm ** 3, u.K, u.g, u.erg / u.g / u.s, u.mol / u.g, u.mol / u.g]
+    zonebIsint = [True] * 4 + [False] * (len (zonebNames) - 4)
+    
+    # The units of every zone array, including the magnetic, viscosity, and diffusion arrays that only fill part of the zones, and of the columns derived from them
+    zoneUnits = dict (zip (zoneiNames, zoneiUnits))
+    zoneUnits.update (zip (zonecNames, zonecUnits))
+    zoneUnits.update (zip (zonebNames, zonebUnits))
+    zoneUnits.update ({'bfvisc': u.cm ** 2 / u.s, 'bfdiff': u.cm ** 2 / u.s, 'bfbr': u.gauss, 'bfbt': u.gauss, 'bfviscef': u.cm ** 2 / u.s, 'bfdiffef': u.cm ** 2 / u.s, 'angdgeff': u.cm ** 2 / u.s, 'difieff': u.cm ** 2 / u.s})
+    derivedUnits = {'mass coordinate': u.g, 'beta': u.dimensionless_unscaled, 'zbar': u.dimensionless_unscaled, 'ledd': u.erg / u.s}
+    
+    def __init__(self, fileName, loadBurn = False, memmap = False, useIndex = False, lazy = False, sparse = False, cache = None):
+        super(DataDump, self).__init__ (fileName, memmap)
         self.data = {}
         self.units = {}
         self.stardata = {}
-        self.file = fortranfile.FortranFile (fileName)
-        
-        # Read dump file contents
-        self._read_full (loadBurn)
-
-        self.file.close ()
-        
-        self.df ["beta"] = ((self ["tn"] * self ["dn"] * (1 + self ["zbar"]) / self ["abar"].value * consts.k_B / consts.m_p) / self ["pn"]).to (1)
+        self.columns = {}
+        self.df = None
+        self.abundances = None
+        self.sparse = sparse
+        self.loadBurn = bool (loadBurn and self.parameters ['imaxb'] > 0)
+        
+        if cache is None:
+            cache = DumpCache.fromEnvironment ()
+        elif isinstance (cache, str):
+            cache = DumpCache (cache)
+        if lazy or cache is False:
+            cache = None
+        if cache is not None and cache.load (self):
+            return
+        
+        if lazy and useIndex and self.loadIndex () and (not self.loadBurn or 'ppnb' in self.index):
+            # Every array can be found from the index file, so there is no need to read anything now
+            pass
+        else:
+            # Read dump file contents; a lazy read is always mapped, so that it only walks the file to find the arrays
+            self.memmap = memmap or lazy
+            self._open ()
+            self._read_full (loadBurn, lazy)
+            self._close ()
+        
+            if useIndex:
+                saved = self._readIndexFile ()
+                if saved is None or not set (self.index).issubset (saved):
+                    self.saveIndex ()
+        
+        if lazy:
+            self._loadIsotopes ()
+            return
+        
+        self.df ["beta"] = self._beta (self ["zbar"])
         self.units ["beta"] = 1.0
 
-        self.df ["zbar"] = np.sum ([self [str (ion)] * ion.z / ion.a * self ["abar"] if ion.a != 0 else 0.0 * self ["abar"] for ion in self.ions], 0)
+        self.df ["zbar"] = self._zbar ()
 
-        self.df ["ledd"] = ((1 - self ["beta"]) * consts.G * self ["mass coordinate"] * 4.0 * np.pi * consts.c / (6.6525e-29 * u.m ** 2 * self ["zbar"] / self ["abar"].value / consts.m_p)).to (u.erg / u.s)
+        self.df ["ledd"] = self._ledd ()
         self.units ["ledd"] = u.erg / u.s
     
+        if cache is not None:
+            cache.save (self)
+    
     def __getitem__ (self, index):
         """
-        Get the index from the pandas dataframe object, adding in units when possible
+        Get the index from the pandas dataframe object, adding in units when possible; if lazy, decode the index from the file instead
         Returns an astropy Quantity object
         """
+        if self.df is None:
+            if index not in self.columns:
+                self.columns [index] = self._decode (index)
+            return self.columns [index]
+        
+        if self.abundances is not None and index in self.abundances:
+            return u.Quantity (self.abundances.column (index))
+        
         # If possible, return quantity object
         try:
-            return u.Quantity (self.df [index])
+            return u.Quantity (self.raw (index), self.unit (index))
         except TypeError as e:
             return self.df [index]
+            
+    def raw (self, index):
+        """
+        Get the index as a plain numpy array, without units; this avoids the overhead of astropy in loops over many columns, with units attached afterward from self.unit (index)
+        The array may be a view into the loaded data, so it should not be modified
+        """
+        if self.df is None:
+            value = self [index]
+            return value.value if isinstance (value, u.Quantity) else value
+        if self.abundances is not None and index in self.abundances:
+            return self.abundances.column (index)
+        values = self.df [index].to_numpy ()
+        if not values.dtype.isnative:
+            # A column still viewing a memory-mapped file is converted once, on first access
+            values = _native (values)
+            self.df [index] = values
+        return values
+        
+    def unit (self, index):
+        """
+        Return the astropy unit of the column index
+        """
+        return u.Unit (self.derivedUnits.get (index, self.zoneUnits.get (index, 1)))
+            
+    def _beta (self, zbar):
+        """
+        Return the ratio of gas pressure to total pressure, given the zbar of each zone
+        """
+        return ((self ["tn"] * self ["dn"] * (1 + zbar) / self ["abar"].value * consts.k_B / consts.m_p) / self ["pn"]).to (1)
+        
+    def _zbar (self):
+        """
+        Return the zbar of each zone, calculated from the abundances
+        """
+        if self.abundances is not None:
+            return u.Quantity (self.abundances.weightedSum (self._ionWeights (lambda ion: ion.z / ion.a)) * self ["abar"].value)
+        return np.sum ([self [str (ion)] * ion.z / ion.a * self ["abar"].value if ion.a != 0 else 0.0 * self ["abar"].value for ion in self.ions], 0)
+        
+    def _ionWeights (self, function):
+        """
+        Return an array of function (ion) for each isotope in the columns of self.abundances, skipping isotopes with no mass number
+        """
+        ions = [ion for ion in self.ions if ion.a != 0]
+        weights = np.zeros (self.abundances.shape [1])
+        np.add.at (weights, self.abundances.indices ([str (ion) for ion in ions]), [function (ion) for ion in ions])
+        return weights
+        
+    def getAbar (self):
+        """
+        Return the abar of each zone, calculated from the abundances rather than read from the dump
+        """
+        if self.abundances is not None:
+            return u.Quantity (1.0 / self.abundances.weightedSum (self._ionWeights (lambda ion: 1.0 / ion.a)), u.g / u.mol)
+        return u.Quantity (1.0 / np.sum ([self [str (ion)] / ion.a for ion in self.ions if ion.a != 0], 0), u.g / u.mol)
+        
+    def _ledd (self):
+        """
+        Return the Eddington luminosity of each zone
+        """
+        return ((1 - self ["beta"]) * consts.G * self ["mass coordinate"] * 4.0 * np.pi * consts.c / (6.6525e-29 * u.m ** 2 * self ["zbar"] / self ["abar"].value / consts.m_p)).to (u.erg / u.s)
+        
+    def _abundanceArrays (self):
+        """
+        Return the names of the ppn, network, network number, ion name, aion, and zion arrays and the number of ions for the loaded network
+        """
+        if self.loadBurn:
+            return 'ppnb', 'zionnb', 'netnumb', 'ionbmax', 'nabmax', 'nzbmax', self.numBurnIons
+        return 'ppn', 'zionn', 'netnum', 'ions', 'aion', 'zion', self.numTotalIons
+        
+    def _loadIsotopes (self):
+        """
+        Create the isotope list of the loaded network from the indexed ion arrays
+        """
+        ppn, ionn, netnum, ions, aion, zion, numIons = self._abundanceArrays ()
+        self.ionNames = [_decodeChars (ion) for ion in self.readArray (ions) [:numIons]]
+        aion = _native (self.readArray (aion))
+        zion = _native (self.readArray (zion))
+        self.ions = [Isotope (self.ionNames [i], aion [i], zion [i]) for i in range (numIons) if self.ionNames [i] != '']
+        
+    def _decode (self, name):
+        """
+        Decode the single column name from the file, as it would appear in the data frame
+        """
+        if name == 'mass coordinate':
+            return self.parameters ['totm'] + self.parameters ['summ0'] - self ['ym']
+        if name == 'beta':
+            # Like the full read, use the zbar from the file rather than that calculated from the abundances
+            return self._beta (self._decodeZone ('zbar'))
+        if name == 'zbar':
+            return u.Quantity (self._zbar ())
+        if name == 'ledd':
+            return self._ledd ()
+        if name in self.index and self.index [name] ['start'] is not None:
+            return self._decodeZone (name)
+        if name in self.ionNames:
+            return self._decodeAbundance (name)
+        raise KeyError (name)
+        
+    def _decodeZone (self, name):
+        """
+        Decode the zone array name, dropping the ghost zones at either end
+        """
+        entry = self.index [name]
+        values = _native (self.readArray (name))
+        if values.dtype.kind == 'S':
+            return np.array ([_decodeChars (value) for value in values]) [1:-1]
+        zone = np.zeros (self.jmsave + 1, dtype = values.dtype)
+        zone [entry ['start']:entry ['start'] + len (values)] = values
+        return u.Quantity (zone [1:-1], self.unit (name))
+        
+    def _decodeAbundance (self, name):
+        """
+        Decode the mass fraction of the ion name in each zone from the ppn data of the zone's network
+        """
+        ppn, ionn, netnum, ions, aion, zion, numIons = self._abundanceArrays ()
+        
+        # Like the full read, a repeated ion name refers to the last ion with that name
+        i = len (self.ionNames) - 1 - self.ionNames [::-1].index (name)
+        
+        # Find where the ion sits in the ppn data of each zone
+        positions = _ionPositions (_native (self.readArray (ionn)), numIons)
+        column = positions [_native (self.readArray (netnum)) [1:self.jmsave] - 1, i]
+        
+        ppn = self.readArray (ppn)
+        abundance = np.zeros (self.jmsave - 1)
+        found = column >= 0
+        abundance [found] = ppn [np.arange (self.jmsave - 1) [found], column [found]] * _native (self.readArray (aion)) [i]
+        return u.Quantity (abundance)
     
     def getIsotope (self, string):
         """
@@ -429,7 +1124,7 @@ class DataDump (Dump):
         """
         if string not in [str (i) for i in self.ions]:
             raise IndexError (string)
-        for key in self.df:
+        for key in (self.df if self.df is not None and self.abundances is None else self.ionNames):
             if str (key) == string:
                 return key
         raise IndexError (string)
@@ -445,22 +1140,68 @@ class DataDump (Dump):
         Returns an astropy quantity of the core mass associated with the isotope string
         """
         isos = [str (iso) for iso in self.getIsotopes ()]
-        index = len (self [string]) - 1 - np.argmax (np.diff (self [string] < self.df [isos].max (1)) [::-1])
+        if isinstance (self.abundances, AbundanceMatrix):
+            index = self.abundances.coreIndices ([self.abundances.index (string)]) [0]
+        else:
+            if self.abundances is not None:
+                maximum = self.abundances.max ()
+            else:
+                maximum = u.Quantity ([self [iso] for iso in isos]).max (0)
+            index = self._coreIndices (np.asarray (self [string]) [:, np.newaxis], np.asarray (maximum)) [0]
         if index == len (self [string]) - 1:
             return u.Quantity (0.0, 'g')
-        return self.df ['mass coordinate'] [index]
+        return self ['mass coordinate'] [index]
+        
+    def getCores (self):
+        """
+        Returns a dictionary of the core masses associated with every isotope, calculated at once from the abundance matrix
+        """
+        if self.abundances is None:
+            return {str (iso): self.getCore (str (iso)) for iso in self.getIsotopes ()}
+        if isinstance (self.abundances, AbundanceMatrix):
+            indices = self.abundances.coreIndices ()
+        else:
+            indices = self._coreIndices (self.abundances.data, self.abundances.max ())
+        cores = u.Quantity (self ['mass coordinate'])
+        cores = np.where (indices == len (cores) - 1, 0.0, cores.value [indices]) * cores.unit
+        names = [str (iso) for iso in self.getIsotopes ()]
+        return dict (zip (names, cores [self.abundances.indices (names)]))
+        
+    @staticmethod
+    def _coreIndices (abundances, maximum):
+        """
+        Return the index of the outermost zone at which each column of abundances, a (zones, isotopes) array, stops being the most abundant species, or the last zone if there is none
+        """
+        below = abundances < maximum [:, np.newaxis]
+        return len (abundances) - 1 - np.argmax ((below [1:] != below [:-1]) [::-1], 0)
     
-    def _read_full (self, loadBurn = False):
+    def getMass (self, string):
         """
-        Read the dump file into the DataDump object; if loadBurn, read the full burn array, else read only the approx network isotopes
+        Returns an astropy quantity of the total mass of the isotope string in the star
         """
-        self._readInt ()
+        if self.abundances is not None:
+            xm = self ['xm']
+            return u.Quantity (self.abundances.integrate (string, xm.value), xm.unit)
+        return np.sum (self ['xm'] * self [string])
         
-        self.version = self._readInt ()
-
-        # Skip the header and parameters; these are read in during the superclass constructor
-        self._skip ((self.iratioz * self.lenHeader + 3) * 4)
-        self._skip ((self.numParameters + 2 + self.numDerivedParameters + 2) * 8)
+    def getMasses (self):
+        """
+        Returns a dictionary of the total mass of every isotope in the star, integrated at once from the abundance matrix
+        """
+        if self.abundances is None:
+            return {str (iso): self.getMass (str (iso)) for iso in self.getIsotopes ()}
+        xm = self ['xm']
+        masses = u.Quantity (self.abundances.integrateAll (xm.value), xm.unit)
+        names = [str (iso) for iso in self.getIsotopes ()]
+        return dict (zip (names, masses [self.abundances.indices (names)]))
+    
+    def _read_full (self, loadBurn = False, lazy = False):
+        """
+        Read the dump file into the DataDump object; if loadBurn, read the full burn array, else read only the approx network isotopes
+        If lazy, only walk the file to index the arrays, leaving the abundances and data frame to be decoded on access
+        """
+        # Seek past the header and parameters; these are read in during the superclass constructor
+        self.file.seek (self.sections ['smallArrays'])
         
         # Read in the 'small' arrays
         self._readSmallArrays (self.data, self.units)
@@ -470,29 +1211,22 @@ class DataDump (Dump):
         self._readZones (self.stardata, self.units, self.jmsave, self.numInterfacialZoneArrays, self.numCenteredZoneArrays, 33)
         
         # Read in the abundance data for the small network
-        ppn = np.array ([self._readDoubles (self.numNetworkIons) for i in range (self.jmsave - 1)])
+        self._index ('ppn', self.file.tell (), realKinds [8], (self.jmsave - 1, self.numNetworkIons))
+        ppn = self._readArray ((self.jmsave - 1) * self.numNetworkIons, realKinds [8]).reshape ((self.jmsave - 1, self.numNetworkIons))
         self._readDouble ()
         
         # Magnetic fields should be included here
         if (self.parameters ['magnet'] > 0.0):
-            self.stardata ['bfvisc'] = np.zeros (self.jmsave + 1)
-            self.stardata ['bfvisc'] [:-1] = u.Quantity (self._readDoubles (self.jmsave + 1) [:-1], u.cm ** 2 / u.s)
-            self.stardata ['bfdiff'] = np.zeros (self.jmsave + 1)
-            self.stardata ['bfdiff'] [:-1] = u.Quantity (self._readDoubles (self.jmsave + 2) [:-2], u.cm ** 2 / u.s)
-            self.stardata ['bfbr'] = np.zeros (self.jmsave + 1)
-            self.stardata ['bfbr'] [:-1] = u.Quantity (self._readDoubles (self.jmsave + 1) [:-1], u.gauss)
-            self.stardata ['bfbt'] = np.zeros (self.jmsave + 1)
-            self.stardata ['bfbt'] [:-1] = u.Quantity (self._readDoubles (self.jmsave + 2) [:-2], u.gauss)
-            self.stardata ['bfviscef'] = np.zeros (self.jmsave + 1)
-            self.stardata ['bfviscef'] [:-1] = u.Quantity (self._readDoubles (self.jmsave + 1) [:-1], u.cm ** 2 / u.s)
-            self.stardata ['bfdiffef'] = np.zeros (self.jmsave + 1)
-            self.stardata ['bfdiffef'] [:-1] = u.Quantity (self._readDoubles (self.jmsave + 2) [:-2], u.cm ** 2 / u.s)
+            self._readPartialZone (self.stardata, 'bfvisc', self.jmsave + 1, self.jmsave)
+            self._readPartialZone (self.stardata, 'bfdiff', self.jmsave + 2, self.jmsave)
+            self._readPartialZone (self.stardata, 'bfbr', self.jmsave + 1, self.jmsave)
+            self._readPartialZone (self.stardata, 'bfbt', self.jmsave + 2, self.jmsave)
+            self._readPartialZone (self.stardata, 'bfviscef', self.jmsave + 1, self.jmsave)
+            self._readPartialZone (self.stardata, 'bfdiffef', self.jmsave + 2, self.jmsave)
                     
         # Read in the viscosity and diffusion arrays
-        self.stardata ['angdgeff'] = np.zeros (self.jmsave + 1)
-        self.stardata ['angdgeff'] [:-1] = u.Quantity (self._readDoubles (self.jmsave + 1) [:-1], u.cm ** 2 / u.s)
-        self.stardata ['difieff'] = np.zeros (self.jmsave + 1)
-        self.stardata ['difieff'] [:-1] = u.Quantity (self._readDoubles (self.jmsave + 1) [:-1], u.cm ** 2 / u.s)
+        self._readPartialZone (self.stardata, 'angdgeff', self.jmsave + 1, self.jmsave)
+        self._readPartialZone (self.stardata, 'difieff', self.jmsave + 1, self.jmsave)
         
         # Flame data should be included here
         assert (self.parameters ['sharp1'] <= 0.0)
@@ -501,8 +1235,7 @@ class DataDump (Dump):
         assert (self.parameters ['wimp'] <= 0.0)
         
         # Read in the convective energy contribution
-        self.stardata ['sadv'] = np.zeros (self.jmsave + 1)
-        self.stardata ['sadv'] [:-1] = self._readDoubles (self.jmsave + 1) [:-1]
+        self._readPartialZone (self.stardata, 'sadv', self.jmsave + 1, self.jmsave)
         
         # Skip UUID information
         if self.version >= 170004:
@@ -522,8 +1255,7 @@ class DataDump (Dump):
             self._readDouble ()
         
         # Read energy dissipation due to shear
-        self.stardata ['sv'] = np.zeros (self.jmsave + 1)
-        self.stardata ['sv'] [1:-2] = self._readDoubles (self.jmsave - 2)
+        self._readPartialZone (self.stardata, 'sv', self.jmsave - 2, self.jmsave - 2, start = 1)
         
         # Read out user-defined parameters
         # TODO Implement user-defined parameter reader
@@ -540,15 +1272,19 @@ class DataDump (Dump):
             self._readBurnZones (self.stardata, self.units, self.jmsave, self.parameters ['nsaveb'])
         
             # Read in the abundance data for the large network
-            ppnb = np.array ([self._readDoubles (self.numBurnIons) for i in range (self.jmsave - 1)])
+            self._index ('ppnb', self.file.tell (), realKinds [8], (self.jmsave - 1, self.numBurnIons))
+            ppnb = self._readArray ((self.jmsave - 1) * self.numBurnIons, realKinds [8]).reshape ((self.jmsave - 1, self.numBurnIons))
             self._readDoubles (1)
         
             # Read in burn ions informational arrays
             self.maxBurnIons = self._readInt ()
             self._readInts (2)
+            self._index ('nabmax', self.file.tell (), intKinds [8], (self.maxBurnIons,))
             self.data ['nabmax'] = self._readInts (self.maxBurnIons + 2) [:-2]
+            self._index ('nzbmax', self.file.tell (), intKinds [8], (self.maxBurnIons,))
             self.data ['nzbmax'] = self._readInts (self.maxBurnIons + 2) [:-2]
             self.data ['nibmax'] = self._readInts (self.numBurnIons + 2) [:-2]
+            self._index ('ionbmax', self.file.tell (), 'S8', (self.maxBurnIons,))
             self.data ['ionbmax'] = self._readStrings (self.maxBurnIons, 8)
             self._readChars (8, True)
             self.data ['burnamax'] = self._readDoubles (self.maxBurnIons + 1) [:-1]
@@ -558,17 +1294,25 @@ class DataDump (Dump):
             # Read in surface composition
             self.data ['compsurfb'] = self._readDoubles (self.numBurnIons)
         
+        if lazy:
+            return
+        
         # Load ppn data into abundance arrays
-        if not loadBurn:
+        if self.sparse:
+            if not loadBurn:
+                self._loadSparseAbundances (ppn, self.data ['zionn'], self.stardata ['netnum'], self.data ['ions'], self.data ['aion'], self.data ['zion'], self.numTotalIons)
+            else:
+                self._loadSparseAbundances (ppnb, self.data ['zionnb'], self.stardata ['netnumb'], self.data ['ionbmax'], self.data ['nabmax'], self.data ['nzbmax'], self.numBurnIons)
+        elif not loadBurn:
             self._loadAbundances (self.stardata, ppn, self.data ['zionn'], self.numNetworkIons, self.stardata ['netnum'], self.jmsave, self.data ['ions'], self.data ['aion'], self.data ['zion'], self.numTotalIons, self.numNetworks)
         else:
             self._loadAbundances (self.stardata, ppnb, self.data ['zionnb'], self.numBurnIons, self.stardata ['netnumb'], self.jmsave, self.data ['ionbmax'], self.data ['nabmax'], self.data ['nzbmax'], self.numBurnIons, self.numNetworksb)
         
         # Convert stardata into a pandas dataframe object
-        starItems = [(key, list (self.stardata [key] [1:-1])) for key in self.stardata]
-        starItems.append (("mass coordinate", list (self.parameters ['totm'] + self.parameters ['summ0'] - self.stardata ['ym'] [1:-1])))
-        self.df = pandas.DataFrame.from_items (starItems)
-        # self.df = pandas.DataFrame (self.stardata)
+        # The columns are slices of the zone arrays, with units stripped, so no per-zone Python objects are created; if memmap, they are left as views into the file
+        starItems = collections.OrderedDict ((key, (np.asarray (self.stardata [key]) if self.memmap else _native (np.asarray (self.stardata [key]))) [1:-1]) for key in self.stardata)
+        starItems ["mass coordinate"] = (self.parameters ['totm'] + self.parameters ['summ0'] - self.stardata ['ym'] [1:-1]).to_value (self.unit ("mass coordinate"))
+        self.df = pandas.DataFrame (starItems, copy = False)
         
     def _readSmallArrays (self, dic, unitDic):
         """
@@ -588,15 +1332,19 @@ class DataDump (Dump):
         dic ['yeq0'] = self._readDoubles (self.maxYeInitializations) * u.mol / u.g
 
         # Read ion informational arrays
+        self._index ('aion', self.file.tell (), realKinds [8], (self.numTotalIons - 1,))
         dic ['aion'] = self._readDoubles (self.numTotalIons) [:-1]
+        self._index ('zion', self.file.tell (), realKinds [8], (self.numTotalIons - 1,))
         dic ['zion'] = self._readDoubles (self.numTotalIons) [:-1]
         dic ['znumi'] = self._readInts (self.numNetworks * 2) [:self.numNetworks]
+        self._index ('zionn', self.file.tell (), intKinds [8], (self.numNetworks, self.maxNetworkIons - 1), (self.maxNetworkIons * 4, 4))
         dic ['zionn'] = np.array ([self._readInts (self.maxNetworkIons) [:-1] for i in range (2 * self.numNetworks)]) [:self.numNetworks]
         
         # Read burn ion informational arrays
         dic ['aionb'] = self._readDoubles (self.numBurnIons) [:-1]
         dic ['zionb'] = self._readDoubles (self.numBurnIons) [:-1]
         dic ['znumib'] = self._readInts (self.numNetworksb * 2) [:self.numNetworksb]
+        self._index ('zionnb', self.file.tell (), intKinds [8], (self.numNetworksb, self.numBurnIons))
         dic ['zionnb'] = np.array ([self._readInts (self.numBurnIons) for i in range (2 * self.numNetworksb)]) [:self.numNetworksb]
         
         # Read timestep controllers
@@ -651,6 +1399,7 @@ class DataDump (Dump):
         dic ['lastmod'] = self._readChars (16) # Supposedly date of last code compilation, but actually garbage
         
         # Read in ion labels
+        self._index ('ions', self.file.tell (), 'S8', (self.numTotalIons,))
         dic ['ions'] = self._readStrings (self.numTotalIons, 8)
         dic ['ionsb'] = self._readStrings (self.numBurnIons, 8)
         
@@ -682,6 +1431,7 @@ class DataDump (Dump):
         dic ['datapath'] = self._readChars (80)
         
         # Read in convection icons
+        self._index ('icon', self.file.tell (), 'S8', (self.jmsave + 1,), start = 0)
         self.stardata ['icon'] = self._readStrings (self.jmsave + 1, 8)
         self._readDouble ()
         
@@ -689,12 +1439,13 @@ class DataDump (Dump):
         """
         Read the interfacial zones then the centered zones
         """
-        # Read the interfacial zones using the following zone names and units
-        zoneiNames = ['ym', 'rn', 'rd', 'un', 'xln', 'qln', 'qld', 'difi', 'vconvect', 'oslen', 'adindex']
-        zoneiUnits = [u.g, u.cm, u.cm, u.cm / u.s, u.erg / u.s, u.erg / u.s, u.erg / u.s, u.cm ** 2 / u.s]
+        # Read the interfacial zones using the zone names and units in zoneiNames and zoneiUnits
+        zoneiNames = self.zoneiNames
+        zoneiUnits = self.zoneiUnits
     
         for i in range (min (numInterfacialZoneArrays, 33)):
             # If there is no zone name for this zone, use 'zonei###'
+            self._index (zoneiNames [i] if i < len (zoneiNames) else 'zonei' + str (i), self.file.tell (), realKinds [8], (jm + 1,), start = 0)
             if i < len (zoneiNames):
                 dic [zoneiNames [i]] = self._readDoubles (jm + 2) [0:-1]
             else:
@@ -703,12 +1454,12 @@ class DataDump (Dump):
             # Read in units
             if i < len (zoneiUnits):
                 # unitsDic [zoneiNames [i]] = zoneiUnits [i]
-                dic [zoneiNames [i]] = u.Quantity (dic [zoneiNames [i]], zoneiUnits [i], dtype = dic [zoneiNames [i]].dtype)
+                dic [zoneiNames [i]] = u.Quantity (dic [zoneiNames [i]], zoneiUnits [i], dtype = dic [zoneiNames [i]].dtype, copy = False)
             
-        # Read the centered zones using the following zone names, units, and types
-        zonecNames = ['netnum', 'xm', 'dn', 'tn', 'td', 'en', 'pn', 'zn', 'etan', 'sn', 'snn', 'abar', 'zbar', 'xkn', 'xnei', 'stot', 'angj','angdg', 'angddsi', 'angdshi', 'angdssi', 'angdez', 'angdgsf', 'dsold', 'tsold', 'snold', 'snbd', 'snbt', 'abarold', 'abarnbd', 'abarnbt', 'ypbtime', 'ynbtime']
-        zonecUnits = [1, u.g, u.g / u.cm ** 3, u.K, u.K, u.erg / u.g, u.erg / u.cm ** 3, u.erg, 1, u.erg / u.g / u.s, u.erg / u.g / u.s, u.g / u.mol, 1, u.cm ** 2 / u.g, 1.0 / u.cm ** 3, u.k, u.g / u.cm ** 3, u.K, u.erg / u.g / u.s, u.erg * u.cm ** 3 / u.s / u.g ** 2, u.erg / u.g / u.s / u.K, 1, u.cm ** 3 / u.g, 1.0 / u.K, u.mol / u.g / u.s, u.mol / u.g / u.s]
-        zonecIsint = [True] + [False] * (len (zonecNames) - 1)
+        # Read the centered zones using the zone names, units, and types in zonecNames, zonecUnits, and zonecIsint
+        zonecNames = self.zonecNames
+        zonecUnits = self.zonecUnits
+        zonecIsint = self.zonecIsint
     
         for i in range (min (numCenteredZoneArrays, nzonemax - numInterfacialZoneArrays)):
             #If there is no zone name or type, use 'zonec###', assume double and unitless
@@ -719,6 +1470,7 @@ class DataDump (Dump):
                 name = 'zonec' + str (i)
                 isint = False
             
+            self._index (name, self.file.tell (), intKinds [8] if isint else realKinds [8], (jm + 1,), start = 0)
             if isint:
                 dic [name] = self._readInts (2 * (jm + 2)) [:jm + 1]
             else:
@@ -727,17 +1479,26 @@ class DataDump (Dump):
             # Read in units
             if i < len (zonecUnits):
                 # unitsDic [name] = zonecUnits [i]
-                dic [name] = u.Quantity (dic [name], zonecUnits [i], dtype = dic [name].dtype)
+                dic [name] = u.Quantity (dic [name], zonecUnits [i], dtype = dic [name].dtype, copy = False)
             
     
+    def _readPartialZone (self, dic, name, num, count, start = 0):
+        """
+        Read num doubles, the first count of which fill the zone array name from zone start onward; the remaining zones are zero
+        """
+        self._index (name, self.file.tell (), realKinds [8], (count,), start = start)
+        dic [name] = np.zeros (self.jmsave + 1)
+        values = self._readDoubles (num) [:count]
+        dic [name] [start:start + count] = values
+        
     def _readBurnZones (self, dic, unitDic, jm, nsaveb):
         """
         Read in the burn zone arrays
         """
-        # Read using the following names, units, and types
-        zonebNames = ['netnumb', 'zlimab', 'zlimzb', 'zlimcb', 'timen', 'dtimen', 'dnold', 'tnold', 'ymb', 'sburn', 'etab', 'pbuf']
-        zonebUnits = [1, 1, 1, 1, u.s, u.s, u.g / u.cm ** 3, u.K, u.g, u.erg / u.g / u.s, u.mol / u.g, u.mol / u.g]
-        zonebIsint = [True] * 4 + [False] * (len (zonebNames) - 4)
+        # Read using the names, units, and types in zonebNames, zonebUnits, and zonebIsint
+        zonebNames = self.zonebNames
+        zonebUnits = self.zonebUnits
+        zonebIsint = self.zonebIsint
     
         for i in range (nsaveb):
             # If name isn't in name list, use 'zoneb###', assume double and unitless
@@ -748,6 +1509,7 @@ class DataDump (Dump):
                 name = 'zoneb' + str (i)
                 isint = False
             
+            self._index (name, self.file.tell (), intKinds [8] if isint else realKinds [8], (jm + 1,), start = 0)
             if isint:
                 dic [name] = self._readInts (2 * (jm + 2)) [:self.jmsave + 1]
             else:
@@ -756,7 +1518,7 @@ class DataDump (Dump):
             # Read in units
             if i < len (zonebUnits):
                 # unitDic [name] = zonebUnits [i]
-                dic [name] = u.Quantity (dic [name], zonebUnits [i], dtype = dic [name].dtype)
+                dic [name] = u.Quantity (dic [name], zonebUnits [i], dtype = dic [name].dtype, copy = False)
         
     def _loadAbundances (self, dic, ppn, ionn, imax, netnum, jmsave, ions, aion, zion, numTotalIons, nn):
         """
@@ -765,14 +1527,32 @@ class DataDump (Dump):
         self.ions = []
         test = np.zeros ((numTotalIons, jmsave + 1))
         
-        for j in range (jmsave - 1):
-            net  = netnum [j + 1] - 1
-            test [ionn [net] - 1,j + 1] = ppn [j] * aion [ionn [net] - 1]
+        # Scatter the ppn data of all the zones that share a network at once
+        ionn = _native (ionn)
+        aion = _native (aion)
+        nets = _native (netnum) [1:jmsave] - 1
+        for net in np.unique (nets):
+            zones = np.flatnonzero (nets == net)
+            test [np.ix_ (ionn [net] - 1, zones + 1)] = (ppn [zones] * aion [ionn [net] - 1]).T
             
         for i in range (numTotalIons):
             if ions [i] != '':
                 self.ions.append (Isotope (ions [i], aion [i], zion [i]))
                 dic [ions [i]] = test [i]
+        
+        # Keep the abundances as one (zones, isotopes) matrix for whole-network reductions; this is a view, with each isotope's column contiguous
+        self.ionNames = list (ions [:numTotalIons])
+        self.abundances = AbundanceArray (test [:, 1:-1].T, self.ionNames)
+
+    def _loadSparseAbundances (self, ppn, ionn, netnum, ions, aion, zion, numTotalIons):
+        """
+        Load the PPN data into an AbundanceMatrix, leaving the abundances out of the data frame
+        """
+        aion = _native (aion)
+        zion = _native (zion)
+        self.ionNames = list (ions [:numTotalIons])
+        self.ions = [Isotope (self.ionNames [i], aion [i], zion [i]) for i in range (numTotalIons) if self.ionNames [i] != '']
+        self.abundances = AbundanceMatrix (ppn, _native (ionn), _native (netnum) [1:self.jmsave], aion, self.ionNames)
 
 # For testing
 # d = DataDump ("s15o0s0#presn")
@@ -1,22 +1,120 @@
-import fortranfile
-import numpy as np
+import os
+import mmap
 import struct
 import re
+import numpy as np
+
+# Big-endian numpy types for each fortran kind, built once rather than on every read
+int_kinds = {16: np.dtype ('>i8'), 8: np.dtype ('>i4'), 4: np.dtype ('>i2'), 2: np.dtype ('>i1')}
+real_kinds = {8: np.dtype ('>f8'), 4: np.dtype ('>f4')}
+
+def decode_chars (chars):
+    """
+    Convert a fortran character array into a python string, dropping unprintable characters and trailing spaces
+
+    :type chars: :class:`bytes`
+    """
+    return re.sub(r'[^ -~]', '', chars.decode ('utf-8')).rstrip ()
 
-class OutputFile:
+class OutputFile (object):
     """
-    This class reads a fortran output file into memory.
+    This class is the base reader of KEPLER's fortran output files, shared by the dump and cnv readers.
+
+    The file is read through a buffered file object, or through a memory map if memmap, in which case arrays are read as big-endian views into the mapping rather than copied out of it. Reads go through a few numpy calls rather than per-value struct unpacking, skips are seeks, and a read past the end of the file raises a TypeError rather than decoding whatever is there.
+
+    The file is opened by _open (or by using the object in a with statement) and closed by _close.
 
     :type file_name: :class:`str`
-    :param file_name: The location of the CNV file to load
+    :param file_name: The location of the file to load
     """
-    
-    def __init__ (self, file_name, max_model = None, verbose = False):
+
+    # The record length marker written before and after each fortran record
+    marker = struct.Struct ('>i')
+
+    def __init__ (self, file_name, memmap = False):
         self.file_name = file_name
-        self.reload ()
+        self.memmap = memmap
+        self.buffer = None
+        self.file = None
+
+    def __enter__ (self):
+        return self._open ()
+
+    def __exit__ (self, *args):
+        self._close ()
+
+    def _open (self):
+        """
+        Open the file for reading from the start; if self.memmap, map the file into memory (only once, reusing any existing map)
+        """
+        if not self.memmap:
+            self.file = open (self.file_name, 'rb')
+            return self
+        if self.buffer is None:
+            with open (self.file_name, 'rb') as file:
+                self.buffer = mmap.mmap (file.fileno (), 0, access = mmap.ACCESS_READ)
+        self.file = self.buffer
+        self.file.seek (0)
+        return self
+
+    def _close (self):
+        """
+        Close the file; a memory map is left open since the arrays read from it are views into it
+        """
+        if self.buffer is None and self.file is not None:
+            self.file.close ()
 
     def reload (self):
-        self.file = fortranfile.FortranFile (self.file_name)
+        """
+        Open the file again from the start
+        """
+        self._close ()
+        self._open ()
+
+    def _index_file_name (self):
+        """
+        Return the name of the .kidx index file kept next to the file by the dump and cnv readers, which is hidden so that the globs used to find the files (e.g. '*#*') do not match it
+        """
+        directory, name = os.path.split (self.file_name)
+        return os.path.join (directory, '.' + name + '.kidx')
+
+    def _size (self):
+        """
+        Return the size of the file in bytes
+        """
+        if self.buffer is not None:
+            return len (self.buffer)
+        return os.fstat (self.file.fileno ()).st_size
+
+    def _read_bytes (self, num):
+        """
+        Read num bytes from self.file, raising a TypeError if the file ends before them
+
+        :type num: :class:`int`
+        :rtype: :class:`bytes`
+        """
+        data = self.file.read (num)
+        if len (data) != num:
+            raise TypeError ("Unexpected end of file %s: expected %i bytes, found %i" % (self.file_name, num, len (data)))
+        return data
+
+    def _read_array (self, num, dtype):
+        """
+        Read num values of numpy type dtype from self.file
+        Return a np array that is a view into the memory map if there is one and a view into the bytes read otherwise
+
+        :type num: :class:`int`
+        :param num: The number of values to read
+        :type dtype: :class:`numpy.dtype`
+        :param dtype: The type of the values, in the byte order of the file
+        """
+        if self.buffer is not None:
+            if self.file.tell () + num * dtype.itemsize > len (self.buffer):
+                raise TypeError ("Unexpected end of file %s" % self.file_name)
+            array = np.frombuffer (self.buffer, dtype = dtype, count = num, offset = self.file.tell ())
+            self.file.seek (num * dtype.itemsize, os.SEEK_CUR)
+            return array
+        return np.frombuffer (self._read_bytes (num * dtype.itemsize), dtype = dtype, count = num)
 
     def _read_int (self, kind_length = 8):
         """
@@ -27,19 +125,19 @@ class OutputFile:
         :rtype: :class:`int`
         :return: The integer representatation of the data
         """
-        return self._read_ints (1, kind_length) [0]
+        return int (self._read_ints (1, kind_length) [0])
 
     def _read_double (self, kind_length = 8):
         """
         Read a real number from self.file
 
         :type kind_length: :class:`int`
-        "param kind_length: The byte length of the real number
+        :param kind_length: The byte length of the real number
         :rtype: :class:`float`
         :return: The float representatation of the read data
         """
-        return self._read_doubles (1, kind_length) [0]
-    
+        return float (self._read_doubles (1, kind_length) [0])
+
     def _read_ints (self, num, kind_length = 8):
         """
         Read a list of integers from self.file
@@ -47,69 +145,113 @@ class OutputFile:
         :type num: :class:`int`
         :param num: The number of integers to read
         :type kind_length: :class:`int`
-        :param kind_length: The byte length of the integers
-        :rtype: :class:`list` of :class:`int`
-        :return: The list of integers representatating of the read data
-        """
-        if kind_length == 16:
-            return np.array (struct.unpack ('>' + str (num) + 'q', self.file.read (num * 8)), dtype = int)
-        if kind_length == 8:
-            return np.array (struct.unpack ('>' + str (num) + 'i', self.file.read (num * 4)), dtype = int)
-        if kind_length == 4:
-            return np.array (struct.unpack ('>' + str (num) + 'h', self.file.read (num * 2)), dtype = int)
-        if kind_length == 2:
-            return np.array (struct.unpack ('>' + str (num) + 'b', self.file.read (num)), dtype = int)
-        raise TypeError ("Unrecognized integer kind.")
-    
-    def _read_doubles (self, num, kind = 8):
+        :param kind_length: The fortran kind of the integers (2, 4, 8 or 16)
+        :rtype: :class:`numpy.ndarray`
+        :return: The integers, in the big-endian byte order of the file
+        """
+        if kind_length not in int_kinds:
+            raise TypeError ("Unrecognized integer kind.")
+        return self._read_array (num, int_kinds [kind_length])
+
+    def _read_doubles (self, num, kind_length = 8):
         """
         Read a list of real numbers from self.file
 
         :type num: :class:`int`
         :param num: The number of real numbers to read
         :type kind_length: :class:`int`
-        :param kind_length: The byte length of the real numbers
-        :rtype: :class:`list` of :class:`float`
-        :return: The string representatation of the read data
+        :param kind_length: The fortran kind of the real numbers (4 or 8)
+        :rtype: :class:`numpy.ndarray`
+        :return: The real numbers, in the big-endian byte order of the file
         """
-        if kind == 8:
-            return np.array (struct.unpack ('>' + str (num) + 'd', self.file.read (num * 8)))
-        if kind == 4:
-            return np.array (struct.unpack ('>' + str (num) + 'f', self.file.read (num * 4)))
-        raise TypeError ("Unrecognized double kind.")
+        if kind_length not in real_kinds:
+            raise TypeError ("Unrecognized double kind.")
+        return self._read_array (num, real_kinds [kind_length])
 
     def _read_chars (self, num, as_byte_string = False):
         """
         Read a string from self.file
 
         :type num: :class:`int`
-        :param num: The number of integers to read
+        :param num: The number of characters to read
         :rtype: :class:`str`
         :return: The string representatation of the read data
         """
-        chars = self.file.read (num)
+        chars = self._read_bytes (num)
         if as_byte_string:
             return chars
-        chars = re.sub(r'[^ -~]', '', chars.decode ('utf-8'))
-        return chars.rstrip ()
+        return decode_chars (chars)
 
     def _read_strings (self, num, chars_per, as_byte_string = False):
         """
-        Read num strings from self.file, if asByteString, return a list of byte strings, else return a list of python strings
+        Read num strings from self.file, if as_byte_string, return a list of byte strings, else return a list of python strings
 
         :type num: :class:`int`
         :param num: The number of strings to load
-        :type charsPer
+        :type chars_per: :class:`int`
+        :param chars_per: The number of characters in each string
         """
         return [self._read_chars (chars_per, as_byte_string) for i in range (num)]
-        
+
     def _skip (self, num):
         """
-        Skip num bytes in self.file
+        Skip num bytes in self.file by seeking past them rather than reading them
 
         :type num: :class:`int`
         :param num: The number of bytes to skip
         """
-        self.file.read (num)
-        
-    
\ No newline at end of file
+        self.file.seek (num, os.SEEK_CUR)
+
+    def _records (self, position = 0, count = None, head = 0):
+        """
+        Locate the complete fortran records of the file from position on, seeking from one record marker to the next
+        Return the byte positions of their starts and ends (including the markers), and the first head bytes of each record's contents
+        A record that is not yet completely written ends the scan; a record whose closing marker does not match its opening marker raises a TypeError
+
+        :type count: :class:`int`
+        :param count: If not None, the largest number of records to locate
+        :type head: :class:`int`
+        :param head: The number of bytes to read from the start of each record
+        """
+        starts = []
+        ends = []
+        heads = []
+        size = self._size ()
+        while position + 4 <= size:
+            if count is not None and len (starts) >= count:
+                break
+            self.file.seek (position)
+            data = self.file.read (4 + head)
+            length = self.marker.unpack_from (data) [0]
+            if length < 0:
+                raise TypeError ("Corrupt record marker at byte %i of %s" % (position, self.file_name))
+            if position + length + 8 > size:
+                break
+            self.file.seek (position + 4 + length)
+            if self.marker.unpack (self.file.read (4)) [0] != length:
+                raise TypeError ("Record markers do not match at byte %i of %s" % (position, self.file_name))
+            starts.append (position)
+            heads.append (data [4:])
+            position += length + 8
+            ends.append (position)
+        return np.array (starts, dtype = int), np.array (ends, dtype = int), heads
+
+    def _read_spans (self, starts, ends):
+        """
+        Read the bytes from each of starts to the matching end, seeking over the bytes in between
+        Return the bytes read as a numpy array with the positions of the spans in it
+
+        :type starts: :class:`numpy.ndarray`
+        :type ends: :class:`numpy.ndarray`
+        """
+        # Read each run of adjacent spans at once
+        runs = np.split (np.arange (len (starts)), np.flatnonzero (starts [1:] != ends [:-1]) + 1)
+        chunks = []
+        for run in runs:
+            if len (run) > 0:
+                self.file.seek (starts [run [0]])
+                chunks.append (self._read_bytes (ends [run [-1]] - starts [run [0]]))
+        buffer = np.frombuffer (b''.join (chunks), dtype = np.uint8)
+        lengths = ends - starts
+        positions = np.cumsum (lengths) - lengths
+        return buffer, positions, positions + lengths
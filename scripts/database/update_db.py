@@ -1,24 +1,22 @@
 #!/usr/bin/env python
 
-import sys
+import argparse
 
 from kepler_utils.database.database import DumpFileEntry, CNVFileEntry
 
-if len (sys.argv) > 1:
-    path = sys.argv [1]
-else:
-    path = '.' 
-    
-if len (sys.argv) > 2:
-    globstring = sys.argv [2]
-else:
-    globstring = "*"
+parser = argparse.ArgumentParser ()
+parser.add_argument ('path', nargs = '?', default = '.')
+parser.add_argument ('globstring', nargs = '?', default = '*')
+parser.add_argument ('tags', nargs = '*', default = [])
+parser.add_argument ('--bulk', action = 'store_true')
+parser.add_argument ('--batch-size', type = int, default = 1000)
+parser.add_argument ('--processes', type = int, default = None)
+parser.add_argument ('--index', default = None)
 
-if len (sys.argv) > 3:
-    tags = sys.argv [3:]
-else:
-    tags = []
+namespace = parser.parse_args ()
+if namespace.processes is not None and namespace.processes > 1 and not namespace.bulk:
+    parser.error ("--processes requires --bulk")
 
-DumpFileEntry.scan_for_updates (path, globstring + '#*', tags = tags, log_info = True)
+DumpFileEntry.scan_for_updates (namespace.path, namespace.globstring + '#*', tags = namespace.tags, log_info = True, bulk = namespace.bulk, batch_size = namespace.batch_size, processes = namespace.processes, index_file = namespace.index)
 
-CNVFileEntry.scan_for_updates (path, globstring + '.cnv', tags = tags)
+CNVFileEntry.scan_for_updates (namespace.path, namespace.globstring + '.cnv', tags = namespace.tags, bulk = namespace.bulk, batch_size = namespace.batch_size, processes = namespace.processes, index_file = namespace.index)
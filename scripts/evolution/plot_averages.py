@@ -15,6 +15,7 @@ parser.add_argument ("--states", nargs = "*", default = ["heign", "hedep"])
 parser.add_argument ("--binkey", default = "scpower")
 parser.add_argument ("--binlog", dest = "binlog", action = 'store_true')
 parser.add_argument ("--checkcache", dest = "checkcache", action = 'store_true')
+parser.add_argument ("--processes", type = int, default = None)
 
 namespace = parser.parse_args ()
 
@@ -31,7 +32,7 @@ except TypeError:
     axes = [axes]
 
 if namespace.checkcache:
-    cache (session, q.add_entity (SimulationEntry).filter (DumpFileEntry.state == "presn").all (), {cache: getattr (kepler_utils.database.cache, cache) for cache in namespace.caches}, states = [state for state in namespace.states])
+    cache (session, q.add_entity (SimulationEntry).filter (DumpFileEntry.state == "presn").all (), {cache: getattr (kepler_utils.database.cache, cache) for cache in namespace.caches}, states = [state for state in namespace.states], processes = namespace.processes)
 
 for cache, axis in zip (namespace.caches, axes):
     colors = cycle (["blue", "green", "red"])
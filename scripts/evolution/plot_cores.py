@@ -16,6 +16,7 @@ parser.add_argument ("--ykeys", nargs = "*", default = ["co_core"])
 parser.add_argument ("--skey", default = "scpower")
 parser.add_argument ("--ckey", default = "osfactor")
 parser.add_argument ("--checkcache", dest = "checkcache", action = 'store_true')
+parser.add_argument ("--processes", type = int, default = None)
 parser.add_argument ("--exclude", nargs = "*", default = [])
 
 namespace = parser.parse_args ()
@@ -47,7 +48,7 @@ if namespace.checkcache:
         except AttributeError:
             caches.append (key)
 
-    cache (session, q.add_entity (SimulationEntry).filter (DumpFileEntry.complete).all (), {cache: getattr (kepler_utils.database.cache, cache) for cache in caches}, states = [state for state in namespace.states])
+    cache (session, q.add_entity (SimulationEntry).filter (DumpFileEntry.complete).all (), {cache: getattr (kepler_utils.database.cache, cache) for cache in caches}, states = [state for state in namespace.states], processes = namespace.processes)
 
 for i, ykey, axisList in zip (range (len (namespace.ykeys)), namespace.ykeys, axes):
     axisList [0].set_ylabel (ykey)
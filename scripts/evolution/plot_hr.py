@@ -32,10 +32,10 @@ fig = plt.figure ()
 ax = plt.subplot (111)
 
 for cnv_record in records:
-    radii = u.Quantity ([model [-1] for model in cnv_record ['rncoord']])
+    radii = cnv_record.column ('rncoord').last () * cnv_record.unit ('rncoord')
     lum = u.Quantity (cnv_record ['xlum_cnv'])
     temp = (lum / 4 / pi / radii ** 2 / sigma_sb) ** (0.25)
-    mass = u.Quantity ([model [-1] for model in cnv_record ['xmcoord']])
+    mass = cnv_record.column ('xmcoord').last () * cnv_record.unit ('xmcoord')
     points = []
     times = cnv_record ['timesec']
     timezero = u.Quantity (0.0, u.yr)
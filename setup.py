@@ -11,6 +11,6 @@ setup(name='kepler_utils',
       author_email='jumbrown@ucsc.edu',
       license='MIT',
       packages=['kepler_utils'],
-      install_requires=["matplotlib","sqlalchemy","numpy","astropy","periodictable","fortranfile","pandas","celery"],
+      install_requires=["matplotlib","sqlalchemy","numpy","astropy","periodictable","pandas","celery"],
       scripts=scripts,
       zip_safe=False)
\ No newline at end of file